@@ -1,12 +1,18 @@
 import argparse
 import sys
+import time
 from pathlib import Path
+from typing import List, Optional
 from rich.console import Console
 from rich.logging import RichHandler
 import logging
 
-from .core import Seppy
-from .config import DEFAULT_CONFIG
+from .core import Seppy, load_config
+from .batch import discover_sources, process_files, get_input_root, load_index, update_index
+from .config import DEFAULT_CONFIG, WATCH_INTERVAL, WATCH_DEBOUNCE, OUTPUT_MANIFEST_NAME
+from .vcs import get_changed_files
+from .cache import AnalysisCache, get_cache_dir
+from .watch import Watcher
 from .exceptions import ScriptSplitterError
 
 # Logging setup
@@ -20,28 +26,66 @@ logging.basicConfig(
 logger = logging.getLogger("seppy")
 console = Console()
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Main entry point for the program."""
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == "cache":
+        return cache_main(argv[1:])
+    if argv and argv[0] == "watch":
+        return watch_main(argv[1:])
+    
     parser = argparse.ArgumentParser(
         description="Seppy - A tool for splitting Python scripts into modules"
     )
     parser.add_argument(
-        "source_file",
-        help="Path to the source Python file"
+        "sources",
+        nargs="+",
+        metavar="source",
+        help="Python file, directory or glob pattern (e.g. 'src/**/*.py')"
     )
     parser.add_argument(
         "-o", "--output",
         help="Output directory (default: output)",
         default="output"
     )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        help="Number of files processed in parallel (default: CPU count; "
+             "lowered with a warning if the memory limit is too small)"
+    )
     parser.add_argument(
         "-c", "--config",
         help="Path to configuration file (JSON or YAML)"
     )
+    parser.add_argument(
+        "--gitignore",
+        action="store_true",
+        help="Skip files ignored by .gitignore files when scanning directories"
+    )
     parser.add_argument(
         "-m", "--memory-limit",
         type=int,
-        help="Memory limit in MB"
+        help="Memory limit in MB; with several files it covers the whole batch "
+             "and is split between the workers, each getting at least 256 MB"
+    )
+    parser.add_argument(
+        "--since",
+        metavar="REV",
+        help="Only split files changed since a git revision; outputs of the "
+             "other files are kept and the combined outputs are merged"
+    )
+    parser.add_argument(
+        "-i", "--incremental",
+        action="store_true",
+        help="Only regenerate the modules of definitions added or changed since "
+             "the last incremental run into the output directory"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Analysis cache directory, may be shared between checkouts "
+             "(default: $SEPPY_CACHE_DIR, CACHE_CONFIG.DIRECTORY or .seppy_cache)"
     )
     parser.add_argument(
         "-v", "--verbose",
@@ -49,34 +93,47 @@ def main():
         help="Enable verbose logging"
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Configure logging level
     if args.verbose:
         logger.setLevel(logging.DEBUG)
     
     try:
+        if len(args.sources) > 1 or not Path(args.sources[0]).is_file():
+            return process_batch(args)
+        
         # Check if source file exists
-        source_path = Path(args.source_file)
+        source_path = Path(args.sources[0])
         if not source_path.exists():
-            raise FileNotFoundError(f"File not found: {args.source_file}")
+            raise FileNotFoundError(f"File not found: {args.sources[0]}")
+        
+        if args.since and (Path(args.output) / OUTPUT_MANIFEST_NAME).exists():
+            if source_path.resolve() not in get_changed_files(args.since, get_input_root(str(source_path))):
+                logger.info(f"{source_path} is unchanged since {args.since}, keeping {args.output}")
+                return 0
         
         # Initialize Seppy
         splitter = Seppy(
             source_file=str(source_path),
             config_file=args.config,
-            memory_limit_mb=args.memory_limit
+            memory_limit_mb=args.memory_limit,
+            cache_dir=args.cache_dir
         )
         
-        # Parse and split the script
-        logger.info("Starting script analysis...")
-        modules = splitter.parse_script(str(source_path))
-        logger.info(f"Found {len(modules)} modules")
-        
-        # Save results
         output_path = Path(args.output)
-        logger.info(f"Saving modules to {output_path}...")
-        splitter.save_modules(str(output_path))
+        if args.incremental:
+            changes = splitter.split_incremental(str(output_path))
+            for kind in ("added", "changed", "removed"):
+                if changes[kind]:
+                    logger.info(f"{kind.capitalize()}: {', '.join(changes[kind])}")
+            logger.info("Done! 🎉")
+            return 0
+        
+        # Parse the script and save its modules
+        logger.info(f"Splitting {source_path} into {output_path}...")
+        modules = splitter.split(str(output_path))
+        logger.info(f"Saved {len(modules)} modules")
         
         logger.info("Done! 🎉")
         return 0
@@ -91,5 +148,179 @@ def main():
         logger.error(f"Unexpected error: {e}")
         return 1
 
+def process_batch(args: argparse.Namespace) -> int:
+    """Split every Python file found in directories and glob patterns.
+    
+    Each file is written to its own subdirectory of the output directory;
+    the combined dependency graph and documentation index are written to
+    the output directory itself.
+    """
+    config = load_config(args.config)
+    jobs = discover_sources(
+        args.sources,
+        config["IGNORE_PATTERNS"],
+        args.gitignore or config.get("USE_GITIGNORE", False),
+        exclude=[args.output, get_cache_dir(config, args.cache_dir)]
+    )
+    if not jobs:
+        raise FileNotFoundError(f"No Python files found in: {', '.join(args.sources)}")
+    
+    selected = jobs
+    if args.since:
+        # Files without outputs from an earlier run are split as well
+        changed = get_changed_files(args.since, get_input_root(args.sources[0]))
+        indexed = load_index(args.output)
+        selected = [job for job in jobs if job[0] in changed or job[1].as_posix() not in indexed]
+        logger.info(f"{len(selected)} of {len(jobs)} files changed since {args.since}")
+    
+    logger.info(f"Processing {len(selected)} files...")
+    results = process_files(
+        selected,
+        args.output,
+        config_file=args.config,
+        memory_limit_mb=args.memory_limit,
+        workers=args.jobs,
+        cache_dir=args.cache_dir,
+        incremental=args.incremental
+    )
+    update_index(args.output, jobs, results)
+    
+    failed = [result for result in results if result.error]
+    modules = sum(result.modules for result in results)
+    logger.info(f"Processed {len(results) - len(failed)} of {len(results)} files, {modules} modules")
+    for result in failed:
+        logger.error(f"  {result.source}: {result.error}")
+    
+    if failed:
+        return 1
+    logger.info("Done! 🎉")
+    return 0
+
+def cache_main(argv: List[str]) -> int:
+    """Inspect or clean up the analysis cache (``seppy cache ...``)."""
+    parser = argparse.ArgumentParser(
+        prog="seppy cache",
+        description="Manage the Seppy analysis cache"
+    )
+    parser.add_argument(
+        "action",
+        choices=["stats", "prune", "clear"],
+        help="stats: show cache usage; prune: evict expired and least recently "
+             "used entries; clear: remove every entry"
+    )
+    parser.add_argument(
+        "-c", "--config",
+        help="Path to configuration file (JSON or YAML)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Cache directory (default: $SEPPY_CACHE_DIR, CACHE_CONFIG.DIRECTORY or .seppy_cache)"
+    )
+    parser.add_argument(
+        "--max-size-mb",
+        type=float,
+        help="Size limit for prune (default: CACHE_CONFIG.MAX_SIZE_MB)"
+    )
+    parser.add_argument(
+        "--older-than-days",
+        type=float,
+        help="Evict entries unused for longer (default: CACHE_CONFIG.EXPIRATION_DAYS)"
+    )
+    args = parser.parse_args(argv)
+    
+    cache = AnalysisCache.from_config(load_config(args.config), args.cache_dir)
+    
+    if args.action == "stats":
+        stats = cache.stats()
+        console.print(f"Cache directory: {stats['directory']}")
+        console.print(f"Entries: {stats['entries']} ({stats['definitions']} definitions)")
+        console.print(
+            f"Size: {stats['size'] / (1024 * 1024):.1f} MB of "
+            f"{stats['max_size'] / (1024 * 1024):.0f} MB"
+        )
+        if stats['entries']:
+            console.print(f"Oldest entry used: {time.ctime(stats['oldest'])}")
+            console.print(f"Newest entry used: {time.ctime(stats['newest'])}")
+        return 0
+    
+    if args.action == "prune":
+        max_size = int(args.max_size_mb * 1024 * 1024) if args.max_size_mb is not None else -1
+        max_age_days = args.older_than_days if args.older_than_days is not None else -1
+        removed, freed = cache.prune(max_size=max_size, max_age_days=max_age_days)
+    else:
+        removed, freed = cache.clear()
+    console.print(f"Removed {removed} entries ({freed / (1024 * 1024):.1f} MB)")
+    return 0
+
+def watch_main(argv: List[str]) -> int:
+    """Keep splitting files as they change (``seppy watch ...``)."""
+    parser = argparse.ArgumentParser(
+        prog="seppy watch",
+        description="Watch Python files and re-split the ones that change"
+    )
+    parser.add_argument(
+        "sources",
+        nargs="+",
+        metavar="path",
+        help="Python file, directory or glob pattern (e.g. 'src/**/*.py')"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        help="Output directory (default: output)",
+        default="output"
+    )
+    parser.add_argument(
+        "-c", "--config",
+        help="Path to configuration file (JSON or YAML)"
+    )
+    parser.add_argument(
+        "--gitignore",
+        action="store_true",
+        help="Skip files ignored by .gitignore files when scanning directories"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Analysis cache directory (default: $SEPPY_CACHE_DIR, CACHE_CONFIG.DIRECTORY or .seppy_cache)"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=WATCH_INTERVAL,
+        help=f"Seconds between checks for changes (default: {WATCH_INTERVAL})"
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=WATCH_DEBOUNCE,
+        help=f"Seconds a burst of changes must settle before splitting (default: {WATCH_DEBOUNCE})"
+    )
+    parser.add_argument(
+        "-v", "--verbose",
+        action="store_true",
+        help="Enable verbose logging"
+    )
+    args = parser.parse_args(argv)
+    
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+    
+    try:
+        watcher = Watcher(
+            args.sources,
+            args.output,
+            config_file=args.config,
+            cache_dir=args.cache_dir,
+            use_gitignore=args.gitignore,
+            interval=args.interval,
+            debounce=args.debounce
+        )
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+    except FileNotFoundError as e:
+        logger.error(f"Error: {e}")
+        return 1
+    return 0
+
 if __name__ == "__main__":
     sys.exit(main()) 
\ No newline at end of file
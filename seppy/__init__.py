@@ -1,11 +1,14 @@
 from .core import Seppy
 from .config import SeppyConfig, DEFAULT_CONFIG
 from .models import ModuleInfo, CacheData, ProcessingStats
+from .source import SourceFile
 from .exceptions import (
     ScriptSplitterError,
     ParseError,
     ModuleProcessingError,
-    CacheError
+    CacheError,
+    GitError,
+    MemoryLimitError
 )
 
 __version__ = "1.0.0"
@@ -16,8 +19,11 @@ __all__ = [
     'ModuleInfo',
     'CacheData',
     'ProcessingStats',
+    'SourceFile',
     'ScriptSplitterError',
     'ParseError',
     'ModuleProcessingError',
-    'CacheError'
+    'CacheError',
+    'GitError',
+    'MemoryLimitError'
 ] 
\ No newline at end of file
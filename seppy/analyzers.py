@@ -1,6 +1,15 @@
 import ast
-from typing import Dict, Set, Any, Optional, List, Tuple
+import heapq
+from collections import defaultdict, deque
+from collections.abc import Mapping
+from operator import itemgetter
+from typing import Dict, Set, Any, Optional, List, Tuple, Callable, Union, Iterable, Iterator
 from .models import ModuleInfo
+from .source import SourceFile
+
+_FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+_SCOPE_TYPES = _FUNCTION_TYPES + (ast.ClassDef,)
+
 
 def find_used_imports(node: ast.AST, all_imports: Set[str]) -> Set[str]:
     """Find imports that are actually used in the code."""
@@ -18,10 +27,10 @@ def find_used_globals(node: ast.AST, global_vars: Set[str]) -> Set[str]:
             used_globals.add(node.id)
     return used_globals
 
-def extract_imports(tree: ast.AST, *nodes) -> Set[str]:
-    """Extract all imports from AST nodes."""
+def get_import_names(nodes: Iterable[ast.AST]) -> Set[str]:
+    """Get the imported names of Import and ImportFrom nodes."""
     imports = set()
-    for node in ast.walk(tree):
+    for node in nodes:
         if isinstance(node, ast.Import):
             for name in node.names:
                 imports.add(name.name)
@@ -34,445 +43,1111 @@ def extract_imports(tree: ast.AST, *nodes) -> Set[str]:
                     imports.add(f"{module}.{name.name}")
     return imports
 
+def iter_module_statements(*bodies: List[ast.stmt]) -> Iterator[ast.stmt]:
+    """Iterate over statements that run at the level of their body, in source order.
+
+    Descends into compound statements (if/for/while/with/try/match) but
+    never into function or class bodies, so the cost depends on the number
+    of module-level statements rather than on the size of the tree.
+    """
+    stack = [iter(body) for body in reversed(bodies)]
+    while stack:
+        stmt = next(stack[-1], None)
+        if stmt is None:
+            stack.pop()
+            continue
+        yield stmt
+        if isinstance(stmt, _SCOPE_TYPES):
+            continue
+        blocks = [getattr(stmt, field, None) or [] for field in ('body', 'orelse', 'finalbody')]
+        blocks[1:1] = [handler.body for handler in getattr(stmt, 'handlers', ())]
+        blocks.extend(case.body for case in getattr(stmt, 'cases', ()))
+        for block in reversed(blocks):
+            if block:
+                stack.append(iter(block))
+
+def get_bound_names(stmt: ast.stmt) -> Iterator[str]:
+    """Get the names a statement assigns to."""
+    if isinstance(stmt, ast.Assign):
+        targets = stmt.targets
+    elif isinstance(stmt, (ast.AnnAssign, ast.AugAssign, ast.For, ast.AsyncFor)):
+        targets = [stmt.target]
+    elif isinstance(stmt, (ast.With, ast.AsyncWith)):
+        targets = [item.optional_vars for item in stmt.items if item.optional_vars is not None]
+    else:
+        return
+    for target in targets:
+        for node in ast.walk(target):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+                yield node.id
+
+def scan_module_level(tree: ast.AST) -> Tuple[Set[str], Set[str]]:
+    """Collect module-level global variables and imports.
+
+    Returns:
+        Tuple of (global variable names, import names)
+    """
+    global_vars = set()
+    import_nodes = []
+    for stmt in iter_module_statements(getattr(tree, 'body', [])):
+        if isinstance(stmt, (ast.Import, ast.ImportFrom)):
+            import_nodes.append(stmt)
+        else:
+            global_vars.update(get_bound_names(stmt))
+    return global_vars, get_import_names(import_nodes)
+
+def extract_imports(tree: ast.AST, *nodes) -> Set[str]:
+    """Extract module-level imports, plus imports at the top level of ``nodes``' bodies."""
+    bodies = [getattr(tree, 'body', [])]
+    bodies.extend(getattr(node, 'body', []) for node in nodes)
+    return get_import_names(
+        stmt for stmt in iter_module_statements(*bodies)
+        if isinstance(stmt, (ast.Import, ast.ImportFrom))
+    )
+
+class ScopeIndex:
+    """Parent and enclosing-scope index for an AST, built in a single walk.
+
+    The enclosing scope of a node is the outermost function or class
+    definition that contains it (the definition itself included), which is
+    what the lookup helpers below have always reported.
+    """
+
+    def __init__(self, tree: ast.AST):
+        self.parents: Dict[ast.AST, ast.AST] = {}
+        self._scopes: Dict[ast.AST, ast.AST] = {}
+        self._classes: Dict[ast.AST, ast.ClassDef] = {}
+
+        stack = [(tree, None, None)]
+        while stack:
+            node, scope, outer_class = stack.pop()
+            if scope is None and isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+                scope = node
+            if scope is not None:
+                self._scopes[node] = scope
+            if outer_class is not None:
+                self._classes[node] = outer_class
+            child_class = outer_class
+            if child_class is None and isinstance(node, ast.ClassDef):
+                child_class = node
+            for child in ast.iter_child_nodes(node):
+                self.parents[child] = node
+                stack.append((child, scope, child_class))
+
+    def get_parent(self, node: ast.AST) -> Optional[ast.AST]:
+        """Get the direct parent of a node."""
+        return self.parents.get(node)
+
+    def get_scope(self, node: ast.AST) -> Optional[ast.AST]:
+        """Get the enclosing function or class node."""
+        return self._scopes.get(node)
+
+    def get_scope_name(self, node: ast.AST) -> Optional[str]:
+        """Get the name of the enclosing function or class."""
+        scope = self._scopes.get(node)
+        return scope.name if scope is not None else None
+
+    def get_parent_class(self, node: ast.AST) -> Optional[ast.ClassDef]:
+        """Get the outermost class that strictly contains a node."""
+        return self._classes.get(node)
+
+def get_scope_index(tree: ast.AST) -> ScopeIndex:
+    """Get the scope index for a tree, building it on first use."""
+    # Cached on the tree itself: the index refers back to the tree, so a
+    # weak-keyed cache would keep every tree alive
+    index = getattr(tree, '_seppy_scope_index', None)
+    if index is None:
+        index = ScopeIndex(tree)
+        tree._seppy_scope_index = index
+    return index
+
+class NodeIndex:
+    """Node-type index for an AST, built in a single walk.
+
+    Maps every node type to its nodes together with their position in
+    ast.walk order, so queries return nodes in the same order a walk
+    would without walking the tree again.
+    """
+
+    def __init__(self, tree: ast.AST):
+        self._nodes: Dict[type, List[Tuple[int, ast.AST]]] = defaultdict(list)
+
+        position = 0
+        queue = deque([tree])
+        while queue:
+            node = queue.popleft()
+            self._nodes[type(node)].append((position, node))
+            position += 1
+            queue.extend(ast.iter_child_nodes(node))
+
+    def nodes(self, *node_types: type) -> List[ast.AST]:
+        """Get the nodes of the given exact types in ast.walk order."""
+        if len(node_types) == 1:
+            return [node for _, node in self._nodes.get(node_types[0], ())]
+        entries = [self._nodes[t] for t in node_types if t in self._nodes]
+        return [node for _, node in heapq.merge(*entries, key=itemgetter(0))]
+
+def get_node_index(tree: ast.AST) -> NodeIndex:
+    """Get the node-type index for a tree, building it on first use."""
+    # Cached on the tree itself, like the scope index
+    index = getattr(tree, '_seppy_node_index', None)
+    if index is None:
+        index = NodeIndex(tree)
+        tree._seppy_node_index = index
+    return index
+
+def drop_definition_bodies(tree: ast.AST, keep: Iterable[ast.AST]) -> int:
+    """Empty the bodies of the outermost definitions that contain none of ``keep``.
+
+    Args:
+        tree: Parsed module AST
+        keep: Nodes whose subtrees must stay intact
+
+    Returns:
+        Number of definitions emptied
+    """
+    needed = set(keep)
+    dropped = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, _SCOPE_TYPES):
+            stack.extend(ast.iter_child_nodes(node))
+        elif node.body and not any(child in needed for child in ast.walk(node)):
+            node.body = []
+            dropped += 1
+    if dropped:
+        # The cached indexes still refer to the dropped nodes
+        for attr in ('_seppy_scope_index', '_seppy_node_index'):
+            vars(tree).pop(attr, None)
+    return dropped
+
 def get_parent_function_or_class(node: ast.AST, tree: ast.AST) -> Optional[str]:
     """Get the name of the parent function or class for a given node."""
-    for parent in ast.walk(tree):
-        if isinstance(parent, (ast.FunctionDef, ast.ClassDef)):
-            for child in ast.walk(parent):
-                if child == node:
-                    return parent.name
-    return None
-
-def analyze_complex_structures(node: ast.AST, source_code: str = '') -> Dict[str, Any]:
-    """Analyze complex code structures like nested classes and functions."""
-    structures = {
-        'imports': set(),
-        'globals': set(),
-        'functions': {},
-        'classes': {},
-        'async_functions': {},
-        'decorators': set(),
-        'source': source_code,
-        'assignments': [],
-        'constants': {},
-        'type_aliases': {},
-        'nested_classes': {},
-        'nested_functions': {},
-        'comprehensions': [],
-        'try_blocks': [],
-        'with_blocks': [],
-        'match_cases': [],      # Python 3.10+ match statements
-        'annotations': {},      # Type annotations
-        'dataclasses': {},      # Dataclass fields
-        'protocols': {},        # Protocol definitions
-        'generators': [],       # Generator expressions
-        'lambda_funcs': [],     # Lambda functions
-        'async_with': [],       # Async with blocks
-        'async_for': [],        # Async for loops
-        'type_vars': {},        # TypeVar definitions
-        'generic_types': {},    # Generic type aliases
-        'property_decorators': set(),  # Property decorators
-        'abstract_methods': set(),     # Abstract methods
-        'static_methods': set(),       # Static methods
-        'class_methods': set(),        # Class methods
-        'global_vars': set(),          # Global variables
-        'nonlocal_vars': set(),        # Nonlocal variables
-        'yield_exprs': [],             # Yield expressions
-        'await_exprs': [],             # Await expressions
-        'f_strings': [],               # f-strings
-        'walrus_ops': [],             # Assignment expressions (:=)
-        'type_comments': {},           # Type comments
-        'decorators_with_args': {}     # Decorators with arguments
-    }
-    
-    # Analyze imports
-    for n in ast.walk(node):
-        if isinstance(n, ast.Import):
-            for name in n.names:
-                alias = f" as {name.asname}" if name.asname else ""
-                structures['imports'].add(f"import {name.name}{alias}")
-        elif isinstance(n, ast.ImportFrom):
-            module = n.module or ''
-            for name in n.names:
-                alias = f" as {name.asname}" if name.asname else ""
-                if name.name == '*':
-                    structures['imports'].add(f"from {module} import *")
-                else:
-                    structures['imports'].add(f"from {module} import {name.name}{alias}")
-    
-    # Analyze decorators
-    def extract_decorator(decorator: ast.expr) -> str:
-        if isinstance(decorator, ast.Name):
-            return decorator.id
-        elif isinstance(decorator, ast.Call):
-            if isinstance(decorator.func, ast.Name):
-                args = [ast.unparse(arg) for arg in decorator.args]
-                kwargs = [f"{kw.arg}={ast.unparse(kw.value)}" for kw in decorator.keywords]
-                all_args = args + kwargs
-                return f"{decorator.func.id}({', '.join(all_args)})"
-            elif isinstance(decorator.func, ast.Attribute):
-                return f"{ast.unparse(decorator.func)}({', '.join(ast.unparse(arg) for arg in decorator.args)})"
-        elif isinstance(decorator, ast.Attribute):
-            return ast.unparse(decorator)
-        return ast.unparse(decorator)
-    
-    # Analyze type aliases and constants
-    for n in ast.walk(node):
-        if isinstance(n, ast.AnnAssign) and isinstance(n.target, ast.Name):
-            if n.simple:
-                structures['type_aliases'][n.target.id] = ast.unparse(n.annotation)
-                # Check for generic types
-                if isinstance(n.annotation, ast.Subscript):
-                    structures['generic_types'][n.target.id] = ast.unparse(n.annotation)
-        elif isinstance(n, ast.Assign):
-            for target in n.targets:
-                if isinstance(target, ast.Name):
-                    if target.id.isupper():
-                        structures['constants'][target.id] = ast.unparse(n.value)
+    return get_scope_index(tree).get_scope_name(node)
+
+class DependencyGraphBuilder:
+    """Builds the dependency graph with one traversal per tree.
+
+    The tree is walked once with an explicit scope stack. Every definition
+    gets a parent -> child edge from its enclosing scope (as reported by
+    ScopeIndex), and every call made inside a definition, nested
+    definitions included, becomes a caller -> callee edge. Edges are only
+    collected during the walk; the graph itself is built when first read.
+    """
+
+    def __init__(self):
+        self._graph: Dict[str, Set[str]] = defaultdict(set)
+        self._pending: List[Tuple[Optional[str], str, List[str]]] = []
+
+    def add_tree(self, tree: ast.AST) -> None:
+        """Collect the edges of a tree."""
+        for level in self.collect_edges(tree):
+            self._pending.extend(level)
+
+    @staticmethod
+    def collect_edges(tree: ast.AST) -> List[List[Tuple[Optional[str], str, List[str]]]]:
+        """Walk a tree and return its edges without adding them.
+
+        Returns:
+            (parent, definition, callees) tuples grouped by the depth of the
+            definition below ``tree``, for add_levels
+        """
+        levels: List[List[Tuple[Optional[str], str, List[str]]]] = []
+        queue = deque([(tree, (), None, 0)])
+        while queue:
+            node, scopes, outer, depth = queue.popleft()
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                if outer is None and not isinstance(node, ast.AsyncFunctionDef):
+                    outer = node
+                callees: List[str] = []
+                while len(levels) <= depth:
+                    levels.append([])
+                levels[depth].append((outer.name if outer is not None else None, node.name, callees))
+                scopes = scopes + (callees,)
+            elif isinstance(node, ast.Call) and scopes:
+                callee = None
+                if isinstance(node.func, ast.Name):
+                    callee = node.func.id
+                elif isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name):
+                    callee = node.func.value.id
+                if callee is not None:
+                    for callees in scopes:
+                        callees.append(callee)
+            for child in ast.iter_child_nodes(node):
+                queue.append((child, scopes, outer, depth + 1))
+        return levels
+
+    def add_levels(self, siblings: List[List[List[Tuple[Optional[str], str, List[str]]]]]) -> None:
+        """Add the edges of sibling trees, as collected by collect_edges.
+
+        The edges are added in the order a single walk over the siblings'
+        parent would have collected them, so the graph is the same as if
+        that parent had been passed to add_tree.
+        """
+        depth = max((len(levels) for levels in siblings), default=0)
+        for i in range(depth):
+            for levels in siblings:
+                if i < len(levels):
+                    self._pending.extend(levels[i])
+
+    @property
+    def graph(self) -> Dict[str, Set[str]]:
+        """Get the dependency graph, adding any collected edges first."""
+        if self._pending:
+            graph = self._graph
+            for parent, name, callees in self._pending:
+                if parent:
+                    graph[parent].add(name)
+                if callees:
+                    graph[name].update(callees)
+            self._pending = []
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph: Dict[str, Set[str]]) -> None:
+        self._graph = graph
+        self._pending = []
+
+def extract_decorator(decorator: ast.expr, code: Callable[[ast.AST], str] = ast.unparse) -> str:
+    """Format a decorator expression without the leading '@'."""
+    if isinstance(decorator, ast.Name):
+        return decorator.id
+    elif isinstance(decorator, ast.Call):
+        if isinstance(decorator.func, ast.Name):
+            args = [code(arg) for arg in decorator.args]
+            kwargs = [f"{kw.arg}={code(kw.value)}" for kw in decorator.keywords]
+            all_args = args + kwargs
+            return f"{decorator.func.id}({', '.join(all_args)})"
+        elif isinstance(decorator.func, ast.Attribute):
+            return f"{code(decorator.func)}({', '.join(code(arg) for arg in decorator.args)})"
+    elif isinstance(decorator, ast.Attribute):
+        return code(decorator)
+    return code(decorator)
+
+# Structure categories and the factory for their empty value
+STRUCTURE_CATEGORIES: Dict[str, Callable[[], Any]] = {
+    'imports': set,
+    'globals': set,
+    'functions': dict,
+    'classes': dict,
+    'async_functions': dict,
+    'decorators': set,
+    'assignments': list,
+    'constants': dict,
+    'type_aliases': dict,
+    'nested_classes': dict,
+    'nested_functions': dict,
+    'comprehensions': list,
+    'try_blocks': list,
+    'with_blocks': list,
+    'match_cases': list,            # Python 3.10+ match statements
+    'annotations': dict,            # Type annotations
+    'dataclasses': dict,            # Dataclass fields
+    'protocols': dict,              # Protocol definitions
+    'generators': list,             # Generator expressions
+    'lambda_funcs': list,           # Lambda functions
+    'async_with': list,             # Async with blocks
+    'async_for': list,              # Async for loops
+    'type_vars': dict,              # TypeVar definitions
+    'generic_types': dict,          # Generic type aliases
+    'property_decorators': set,     # Property decorators
+    'abstract_methods': set,        # Abstract methods
+    'static_methods': set,          # Static methods
+    'class_methods': set,           # Class methods
+    'global_vars': set,             # Global variables
+    'nonlocal_vars': set,           # Nonlocal variables
+    'yield_exprs': list,            # Yield expressions
+    'await_exprs': list,            # Await expressions
+    'f_strings': list,              # f-strings
+    'walrus_ops': list,             # Assignment expressions (:=)
+    'type_comments': dict,          # Type comments
+    'decorators_with_args': dict    # Decorators with arguments
+}
+
+# Categories create_complex_module and Seppy cannot work without
+REQUIRED_CATEGORIES = frozenset({'imports', 'globals', 'functions', 'async_functions', 'classes'})
+
+class _Subtree:
+    """Placeholder for the structures of a nested definition."""
+
+    __slots__ = ('node',)
+
+    def __init__(self, node: ast.AST):
+        self.node = node
+
+class _Bucket:
+    """Records mutations of one structures category for the current node."""
+
+    __slots__ = ('_logs', '_category')
+
+    def __init__(self, logs: List[List[Tuple]], category: str):
+        self._logs = logs
+        self._category = category
+
+    def _record(self, method: str, *args) -> None:
+        event = (method, args)
+        for log in self._logs:
+            log.append(event)
+
+    def add(self, value: Any) -> None:
+        self._record('add', value)
+
+    def update(self, values: Any) -> None:
+        self._record('update', values)
+
+    def append(self, value: Any) -> None:
+        self._record('append', value)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self._record('__setitem__', key, value)
+
+class LazyStructures(Mapping):
+    """Structures of one definition, built category by category on first access."""
+
+    def __init__(self, visitor: 'StructureVisitor', node: ast.AST):
+        self._visitor = visitor
+        self._node = node
+        self._values: Dict[str, Any] = {'source': visitor.source_code}
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._values[key]
+        except KeyError:
+            if key not in self._visitor.categories:
+                raise
+        value = self._visitor.build(self._node, key)
+        self._values[key] = value
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._values[key] = value
+
+    def __iter__(self):
+        yield 'source'
+        for key in self._visitor.categories:
+            yield key
+        for key in self._values:
+            if key != 'source' and key not in self._visitor.categories:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"LazyStructures({getattr(self._node, 'name', type(self._node).__name__)!r})"
+
+class StructureVisitor(ast.NodeVisitor):
+    """Single-pass engine and per-run cache behind analyze_complex_structures.
+
+    Nodes are visited once, breadth-first (the same order as ast.walk). The
+    visit only plans the work: every node is queued, with its context, for
+    the handlers registered for its type with register_structure_handler.
+    A handler runs over all of its nodes the first time one of the
+    categories it provides is read, so categories nobody reads are never
+    computed or stringified, and disabled categories are not even planned.
+
+    Every function and class in the visited tree is an analysis root: what
+    a handler records for a node is logged once for each root enclosing it,
+    so the structures of any definition are assembled from work already
+    done for the whole tree instead of re-walking its subtree. Results are
+    memoized per node for the lifetime of the visitor.
+
+    While running, handlers can read ``self.parent`` and ``self.functions``
+    (the enclosing function nodes, outermost first) and record results with
+    ``self.bucket(category)``.
+    """
+
+    handlers: Dict[type, List[Callable[['StructureVisitor', ast.AST], None]]] = defaultdict(list)
+    provides: Dict[Callable, Tuple[str, ...]] = {}
+    categories: Dict[str, Callable[[], Any]] = dict(STRUCTURE_CATEGORIES)
+
+    def __init__(
+        self,
+        source_code: Union[SourceFile, str] = '',
+        preserve_formatting: bool = True,
+        categories: Optional[List[str]] = None
+    ):
+        """Initialize the visitor.
+
+        Args:
+            source_code: Original source code of the visited tree
+            preserve_formatting: Emit code strings as slices of the original
+                source instead of unparsing the nodes
+            categories: Optional names of the categories to analyze; other
+                categories stay empty. Required categories are always kept.
+        """
+        self.source_code = source_code
+        if isinstance(source_code, SourceFile):
+            self.source = source_code
+        else:
+            self.source = SourceFile(source_code) if source_code and preserve_formatting else None
+        self.preserve_formatting = preserve_formatting
+        self.enabled = set(self.categories) if categories is None else set(categories) | REQUIRED_CATEGORIES
+        self.in_fstring = False
+        self.parent: Optional[ast.AST] = None
+        self.functions: Tuple[ast.AST, ...] = ()
+        self.roots: Tuple[ast.AST, ...] = ()
+        self.function_info: Dict[ast.AST, Dict[str, Any]] = {}
+        self._log: Dict[ast.AST, Dict[str, List[Tuple]]] = {}
+        self._plan: Dict[Callable, List[Tuple]] = defaultdict(list)
+        self._pending: Optional[Dict[str, List[Callable]]] = None
+        self._function_roots: Dict[ast.AST, Tuple[ast.AST, ...]] = {}
+        self._function_order: Dict[ast.AST, List[ast.AST]] = defaultdict(list)
+        self._function_entries: Dict[str, Dict[ast.AST, List[Any]]] = defaultdict(lambda: defaultdict(list))
+        self._results: Dict[ast.AST, LazyStructures] = {}
+
+    def visit(self, node: ast.AST) -> None:
+        """Visit every node of the tree once and plan the handler work.
+
+        The visited node is itself an analysis root unless it is a module.
+        """
+        handlers = {
+            node_type: [h for h in type_handlers if self._is_enabled(h)]
+            for node_type, type_handlers in self.handlers.items()
+        }
+        self._pending = None
+        roots: Tuple[ast.AST, ...] = ()
+        if not isinstance(node, ast.Module):
+            roots = (node,)
+            self._log[node] = defaultdict(list)
+
+        queue = deque([(node, None, (), roots, False)])
+        append = queue.append
+        while queue:
+            context = queue.popleft()
+            current, parent, functions, roots, in_fstring = context
+            node_type = type(current)
+            if node_type in _SCOPE_TYPES:
+                if current is not node:
+                    roots = roots + (current,)
+                    self._log[current] = defaultdict(list)
+                    context = (current, parent, functions, roots, in_fstring)
+                if node_type is not ast.ClassDef:
+                    self._function_roots[current] = roots
+                    for root in roots:
+                        self._function_order[root].append(current)
+
+            if roots:
+                for handler in handlers.get(node_type, ()):
+                    if handler in self.provides:
+                        self._plan[handler].append(context)
                     else:
-                        structures['assignments'].append({
-                            'target': target.id,
-                            'value': ast.unparse(n.value)
-                        })
-        elif isinstance(n, ast.NamedExpr):  # Walrus operator
-            structures['walrus_ops'].append({
-                'target': ast.unparse(n.target),
-                'value': ast.unparse(n.value)
-            })
-    
-    # Analyze type variables and protocols
-    for n in ast.walk(node):
-        if isinstance(n, ast.Call) and isinstance(n.func, ast.Name):
-            if n.func.id == 'TypeVar':
-                if n.args:
-                    name = ast.unparse(n.args[0])
-                    bounds = [ast.unparse(arg) for arg in n.args[1:]]
-                    structures['type_vars'][name] = bounds
-            elif n.func.id in ('Protocol', 'runtime_checkable'):
-                if isinstance(n.parent, ast.ClassDef):
-                    structures['protocols'][n.parent.name] = {
-                        'runtime_checkable': n.func.id == 'runtime_checkable',
-                        'methods': []
-                    }
-    
-    # Analyze functions and async functions
-    for n in ast.walk(node):
-        if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)):
-            is_async = isinstance(n, ast.AsyncFunctionDef)
-            args = []
-            
-            # Process arguments
-            if n.args.args:
-                for arg in n.args.args:
-                    try:
-                        annotation = f": {ast.unparse(arg.annotation)}" if arg.annotation else ""
-                        args.append(f"{arg.arg}{annotation}")
-                    except Exception:
-                        args.append(arg.arg)
-            
-            # Process kwargs
-            if n.args.kwarg:
-                try:
-                    kwarg_ann = f": {ast.unparse(n.args.kwarg.annotation)}" if n.args.kwarg.annotation else ""
-                    args.append(f"**{n.args.kwarg.arg}{kwarg_ann}")
-                except Exception:
-                    args.append(f"**{n.args.kwarg.arg}")
-            
-            # Process varargs
-            if n.args.vararg:
-                try:
-                    vararg_ann = f": {ast.unparse(n.args.vararg.annotation)}" if n.args.vararg.annotation else ""
-                    args.append(f"*{n.args.vararg.arg}{vararg_ann}")
-                except Exception:
-                    args.append(f"*{n.args.vararg.arg}")
-            
-            # Process defaults
-            if n.args.defaults:
-                args_with_defaults = list(zip(reversed(n.args.args[-len(n.args.defaults):]), reversed(n.args.defaults)))
-                for arg, default in args_with_defaults:
-                    try:
-                        default_str = ast.unparse(default)
-                        arg_name = arg.arg
-                        # Find the argument in the args list and update it
-                        for i, existing_arg in enumerate(args):
-                            if existing_arg.startswith(arg_name):
-                                args[i] = f"{existing_arg}={default_str}"
-                                break
-                    except Exception:
-                        continue
-            
-            # Process return annotation
+                        self._run(handler, [context])
+
+            if node_type in _FUNCTION_TYPES:
+                functions = functions + (current,)
+            elif node_type is ast.JoinedStr:
+                in_fstring = True
+            # Inlined ast.iter_child_nodes
+            for field in current._fields:
+                value = getattr(current, field, None)
+                if isinstance(value, ast.AST):
+                    append((value, current, functions, roots, in_fstring))
+                elif isinstance(value, list):
+                    for item in value:
+                        if isinstance(item, ast.AST):
+                            append((item, current, functions, roots, in_fstring))
+
+    def _is_enabled(self, handler: Callable) -> bool:
+        """Check whether a handler provides any enabled category."""
+        provided = self.provides.get(handler)
+        return not provided or any(category in self.enabled for category in provided)
+
+    def _run(self, handler: Callable, contexts: List[Tuple]) -> None:
+        """Run a handler over planned nodes."""
+        for current, parent, functions, roots, in_fstring in contexts:
+            self.parent = parent
+            self.functions = functions
+            self.roots = roots
+            self.in_fstring = in_fstring
+            handler(self, current)
+
+    def _run_pending(self, category: str) -> None:
+        """Run every planned handler that provides a category."""
+        if self._pending is None:
+            self._pending = defaultdict(list)
+            for handler, provided in self.provides.items():
+                if handler in self._plan:
+                    for name in provided:
+                        self._pending[name].append(handler)
+        for handler in self._pending.pop(category, ()):
+            if handler in self._plan:
+                self._run(handler, self._plan.pop(handler))
+
+    def code(self, node: ast.AST) -> str:
+        """Get the code of a node, sliced from the original source when possible.
+
+        Nodes without usable source positions (synthesized nodes, nodes
+        inside f-strings whose positions are unreliable) are unparsed.
+        """
+        if self.preserve_formatting and self.source is not None and not self.in_fstring:
+            code = self.source.get_code(node)
+            if code:
+                return code
+        return ast.unparse(node)
+
+    def bucket(self, category: str, scope: Optional[ast.AST] = None) -> _Bucket:
+        """Get a recorder for a structures category.
+
+        Args:
+            category: Structures key to record into
+            scope: Optional enclosing function; when given, only roots that
+                contain that function receive the record
+
+        Returns:
+            Recorder supporting add, update, append and item assignment
+        """
+        roots = self.roots if scope is None else self._function_roots[scope]
+        # Roots dropped by release no longer record anything
+        return _Bucket([self._log[root][category] for root in roots if root in self._log], category)
+
+    def subtree(self, node: ast.AST) -> _Subtree:
+        """Reference the structures of a nested definition in a record."""
+        return _Subtree(node)
+
+    def add_function_entry(self, category: str, func: ast.AST, entry: Any) -> None:
+        """Record an entry of a list category on behalf of an enclosing function."""
+        self._function_entries[category][func].append(entry)
+
+    def get(self, node: ast.AST) -> LazyStructures:
+        """Get the structures of an analysis root."""
+        structures = self._results.get(node)
+        if structures is None:
+            structures = self._results[node] = LazyStructures(self, node)
+        return structures
+
+    def build(self, node: ast.AST, category: str) -> Any:
+        """Build one category of an analysis root's structures."""
+        value = self.categories[category]()
+        if category not in self.enabled:
+            return value
+
+        self._run_pending(category)
+        for method, args in self._log[node].get(category, ()):
+            if method == '__setitem__' and isinstance(args[1], _Subtree):
+                args = (args[0], self.get(args[1].node))
+            getattr(value, method)(*args)
+
+        # Per-function entries come first, grouped by function in visit order
+        entries = self._function_entries.get(category)
+        if entries:
+            functions = self._function_order.get(node, [])
+            value = [entry for func in functions for entry in entries.get(func, [])] + value
+        return value
+
+    def release(self, keep: Optional[Iterable[ast.AST]] = None) -> None:
+        """Drop memoized structures and the records of finished roots to save memory.
+
+        Memoized structures are rebuilt when read again.
+
+        Args:
+            keep: Optional analysis roots that will still be read. The
+                records and planned work of every other root (except roots
+                nested in a kept one) are dropped; reading a dropped root
+                later falls back to a new visitor in analyze_complex_structures.
+        """
+        self._results.clear()
+        if keep is None:
+            return
+
+        needed = set()
+        for root in keep:
+            needed.update(node for node in ast.walk(root) if node in self._log)
+        for root in [root for root in self._log if root not in needed]:
+            del self._log[root]
+            self._function_order.pop(root, None)
+
+        functions = {func for root in needed for func in self._function_order.get(root, ())}
+        for entries in self._function_entries.values():
+            for func in [func for func in entries if func not in functions]:
+                del entries[func]
+        for handler, contexts in self._plan.items():
+            self._plan[handler] = [
+                context for context in contexts
+                if any(root in self._log for root in context[3])
+            ]
+
+    def __contains__(self, node: ast.AST) -> bool:
+        return node in self._log
+
+def register_structure_handler(
+    *node_types: type,
+    provides: Tuple[str, ...] = (),
+    category: Optional[str] = None,
+    factory: Callable[[], Any] = list
+):
+    """Register a handler for node types visited by analyze_complex_structures.
+
+    Args:
+        node_types: AST node classes the handler is called for
+        provides: Categories the handler records into; it runs the first
+            time one of them is read. Handlers without categories run
+            during the visit.
+        category: Optional new structures key created for every analysis;
+            it is added to ``provides``
+        factory: Factory for the initial value of ``category``
+
+    Returns:
+        Decorator that registers ``handler(visitor, node)``
+    """
+    provided = tuple(provides)
+    if category is not None:
+        StructureVisitor.categories[category] = factory
+        provided += (category,)
+
+    def decorator(handler):
+        for node_type in node_types:
+            StructureVisitor.handlers[node_type].append(handler)
+        if provided:
+            StructureVisitor.provides[handler] = provided
+        return handler
+    return decorator
+
+_FUNCTION_CATEGORIES = (
+    'functions', 'async_functions', 'decorators', 'property_decorators',
+    'static_methods', 'class_methods', 'abstract_methods', 'decorators_with_args'
+)
+
+@register_structure_handler(ast.Import, ast.ImportFrom, provides=('imports',))
+def _visit_import(visitor: StructureVisitor, n: ast.AST) -> None:
+    if isinstance(n, ast.Import):
+        for name in n.names:
+            alias = f" as {name.asname}" if name.asname else ""
+            visitor.bucket('imports').add(f"import {name.name}{alias}")
+    else:
+        module = n.module or ''
+        for name in n.names:
+            alias = f" as {name.asname}" if name.asname else ""
+            if name.name == '*':
+                visitor.bucket('imports').add(f"from {module} import *")
+            else:
+                visitor.bucket('imports').add(f"from {module} import {name.name}{alias}")
+
+@register_structure_handler(ast.AnnAssign, provides=('type_aliases', 'generic_types'))
+def _visit_ann_assign(visitor: StructureVisitor, n: ast.AnnAssign) -> None:
+    if isinstance(n.target, ast.Name) and n.simple:
+        visitor.bucket('type_aliases')[n.target.id] = visitor.code(n.annotation)
+        # Check for generic types
+        if isinstance(n.annotation, ast.Subscript):
+            visitor.bucket('generic_types')[n.target.id] = visitor.code(n.annotation)
+
+@register_structure_handler(ast.Assign, provides=('constants', 'assignments'))
+def _visit_assign(visitor: StructureVisitor, n: ast.Assign) -> None:
+    for target in n.targets:
+        if isinstance(target, ast.Name):
+            if target.id.isupper():
+                visitor.bucket('constants')[target.id] = visitor.code(n.value)
+            else:
+                visitor.bucket('assignments').append({
+                    'target': target.id,
+                    'value': visitor.code(n.value)
+                })
+
+@register_structure_handler(ast.NamedExpr, provides=('walrus_ops',))
+def _visit_walrus(visitor: StructureVisitor, n: ast.NamedExpr) -> None:
+    visitor.bucket('walrus_ops').append({
+        'target': visitor.code(n.target),
+        'value': visitor.code(n.value)
+    })
+
+@register_structure_handler(ast.Call, provides=('type_vars', 'protocols'))
+def _visit_typing_call(visitor: StructureVisitor, n: ast.Call) -> None:
+    """Analyze type variables and protocols."""
+    if not isinstance(n.func, ast.Name):
+        return
+    if n.func.id == 'TypeVar':
+        if n.args:
+            name = visitor.code(n.args[0])
+            bounds = [visitor.code(arg) for arg in n.args[1:]]
+            visitor.bucket('type_vars')[name] = bounds
+    elif n.func.id in ('Protocol', 'runtime_checkable'):
+        if isinstance(visitor.parent, ast.ClassDef):
+            visitor.bucket('protocols')[visitor.parent.name] = {
+                'runtime_checkable': n.func.id == 'runtime_checkable',
+                'methods': []
+            }
+
+@register_structure_handler(ast.FunctionDef, ast.AsyncFunctionDef, provides=_FUNCTION_CATEGORIES)
+def _visit_function(visitor: StructureVisitor, n: ast.AST) -> None:
+    is_async = isinstance(n, ast.AsyncFunctionDef)
+    args = []
+
+    # Process arguments
+    if n.args.args:
+        for arg in n.args.args:
             try:
-                returns = f" -> {ast.unparse(n.returns)}" if n.returns else ""
+                annotation = f": {visitor.code(arg.annotation)}" if arg.annotation else ""
+                args.append(f"{arg.arg}{annotation}")
             except Exception:
-                returns = ""
-            
-            # Process decorators
+                args.append(arg.arg)
+
+    # Process kwargs
+    if n.args.kwarg:
+        try:
+            kwarg_ann = f": {visitor.code(n.args.kwarg.annotation)}" if n.args.kwarg.annotation else ""
+            args.append(f"**{n.args.kwarg.arg}{kwarg_ann}")
+        except Exception:
+            args.append(f"**{n.args.kwarg.arg}")
+
+    # Process varargs
+    if n.args.vararg:
+        try:
+            vararg_ann = f": {visitor.code(n.args.vararg.annotation)}" if n.args.vararg.annotation else ""
+            args.append(f"*{n.args.vararg.arg}{vararg_ann}")
+        except Exception:
+            args.append(f"*{n.args.vararg.arg}")
+
+    # Process defaults
+    if n.args.defaults:
+        args_with_defaults = list(zip(reversed(n.args.args[-len(n.args.defaults):]), reversed(n.args.defaults)))
+        for arg, default in args_with_defaults:
             try:
-                decorators = [extract_decorator(d) for d in n.decorator_list]
-                # Analyze special decorators
-                for decorator in n.decorator_list:
-                    if isinstance(decorator, ast.Name):
-                        if decorator.id == 'property':
-                            structures['property_decorators'].add(n.name)
-                        elif decorator.id == 'staticmethod':
-                            structures['static_methods'].add(n.name)
-                        elif decorator.id == 'classmethod':
-                            structures['class_methods'].add(n.name)
-                        elif decorator.id == 'abstractmethod':
-                            structures['abstract_methods'].add(n.name)
-                    elif isinstance(decorator, ast.Call):
-                        structures['decorators_with_args'][n.name] = extract_decorator(decorator)
+                default_str = visitor.code(default)
+                arg_name = arg.arg
+                # Find the argument in the args list and update it
+                for i, existing_arg in enumerate(args):
+                    if existing_arg.startswith(arg_name):
+                        args[i] = f"{existing_arg}={default_str}"
+                        break
             except Exception:
-                decorators = []
-            
-            # Analyze function body
-            for child in ast.walk(n):
-                if isinstance(child, ast.Yield) or isinstance(child, ast.YieldFrom):
-                    structures['yield_exprs'].append({
-                        'func_name': n.name,
-                        'expr': ast.unparse(child)
-                    })
-                elif isinstance(child, ast.Await):
-                    structures['await_exprs'].append({
-                        'func_name': n.name,
-                        'expr': ast.unparse(child)
-                    })
-                elif isinstance(child, ast.Global):
-                    structures['global_vars'].update(child.names)
-                elif isinstance(child, ast.Nonlocal):
-                    structures['nonlocal_vars'].update(child.names)
-                elif isinstance(child, ast.AsyncWith):
-                    structures['async_with'].append({
-                        'func_name': n.name,
-                        'items': [ast.unparse(item) for item in child.items],
-                        'body': [ast.unparse(stmt) for stmt in child.body]
-                    })
-                elif isinstance(child, ast.AsyncFor):
-                    structures['async_for'].append({
-                        'func_name': n.name,
-                        'target': ast.unparse(child.target),
-                        'iter': ast.unparse(child.iter),
-                        'body': [ast.unparse(stmt) for stmt in child.body]
-                    })
-            
-            # Analyze nested functions
-            nested_funcs = {}
-            for child in ast.walk(n):
-                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and child is not n:
-                    nested_funcs[child.name] = {
-                        'is_async': isinstance(child, ast.AsyncFunctionDef),
-                        'args': [a.arg for a in child.args.args],
-                        'decorators': [extract_decorator(d) for d in child.decorator_list],
-                        'docstring': ast.get_docstring(child),
-                        'body': child.body,
-                        'node': child,
-                        'returns': ast.unparse(child.returns) if child.returns else None
-                    }
-            
-            func_info = {
-                'args': args,
-                'returns': returns,
-                'decorators': decorators,
-                'is_async': is_async,
-                'body': n.body,
-                'docstring': ast.get_docstring(n),
-                'nested_functions': nested_funcs,
-                'node': n,
-                'is_generator': any(isinstance(child, (ast.Yield, ast.YieldFrom)) for child in ast.walk(n)),
-                'has_async_with': any(isinstance(child, ast.AsyncWith) for child in ast.walk(n)),
-                'has_async_for': any(isinstance(child, ast.AsyncFor) for child in ast.walk(n))
-            }
-            
-            if is_async:
-                structures['async_functions'][n.name] = func_info
-            else:
-                structures['functions'][n.name] = func_info
-            
-            structures['decorators'].update(decorators)
-    
-    # Analyze classes
-    for n in ast.walk(node):
-        if isinstance(n, ast.ClassDef):
-            methods = []
-            async_methods = []
-            class_vars = []
-            decorators = [extract_decorator(d) for d in n.decorator_list]
-            
-            # Check for dataclass
-            is_dataclass = any(d.id == 'dataclass' for d in n.decorator_list if isinstance(d, ast.Name))
-            
-            # Process class body
-            for item in n.body:
-                if isinstance(item, ast.FunctionDef):
-                    method_info = {
-                        'name': item.name,
-                        'decorators': [extract_decorator(d) for d in item.decorator_list],
-                        'is_property': any(d.id == 'property' for d in item.decorator_list if isinstance(d, ast.Name)),
-                        'is_classmethod': any(d.id == 'classmethod' for d in item.decorator_list if isinstance(d, ast.Name)),
-                        'is_staticmethod': any(d.id == 'staticmethod' for d in item.decorator_list if isinstance(d, ast.Name)),
-                        'is_abstract': any(d.id == 'abstractmethod' for d in item.decorator_list if isinstance(d, ast.Name)),
-                        'body': item.body,
-                        'node': item,
-                        'args': [a.arg for a in item.args.args],
-                        'returns': ast.unparse(item.returns) if item.returns else None
-                    }
-                    methods.append(method_info)
-                elif isinstance(item, ast.AsyncFunctionDef):
-                    async_methods.append({
-                        'name': item.name,
-                        'decorators': [extract_decorator(d) for d in item.decorator_list],
-                        'body': item.body,
-                        'node': item,
-                        'args': [a.arg for a in item.args.args],
-                        'returns': ast.unparse(item.returns) if item.returns else None
-                    })
-                elif isinstance(item, ast.AnnAssign):
-                    if isinstance(item.target, ast.Name):
-                        annotation = ast.unparse(item.annotation)
-                        value = ast.unparse(item.value) if item.value else None
-                        is_classvar = (
-                            isinstance(item.annotation, ast.Subscript) and 
-                            isinstance(item.annotation.value, ast.Name) and 
-                            item.annotation.value.id == 'ClassVar'
-                        )
-                        is_dataclass_field = (
-                            is_dataclass and
-                            isinstance(item.annotation, ast.Call) and
-                            isinstance(item.annotation.func, ast.Name) and
-                            item.annotation.func.id == 'field'
-                        )
-                        
-                        class_vars.append({
-                            'name': item.target.id,
-                            'type': annotation,
-                            'value': value,
-                            'is_class_var': is_classvar,
-                            'is_dataclass_field': is_dataclass_field
-                        })
-                        
-                        if is_dataclass_field:
-                            structures['dataclasses'][item.target.id] = {
-                                'type': annotation,
-                                'default': value,
-                                'metadata': {
-                                    k.arg: ast.unparse(k.value)
-                                    for k in item.annotation.keywords
-                                }
-                            }
-                elif isinstance(item, ast.ClassDef):
-                    structures['nested_classes'][item.name] = analyze_complex_structures(item, source_code)
-            
-            # Process metaclass
-            metaclass = None
-            for keyword in n.keywords:
-                if keyword.arg == 'metaclass':
-                    metaclass = ast.unparse(keyword.value)
-            
-            # Process bases with generic types
-            bases = []
-            for base in n.bases:
-                if isinstance(base, ast.Name):
-                    bases.append(base.id)
-                elif isinstance(base, ast.Subscript):  # Generic types like List[int]
-                    bases.append(ast.unparse(base))
-                else:
-                    bases.append(ast.unparse(base))
-            
-            structures['classes'][n.name] = {
-                'methods': methods,
-                'async_methods': async_methods,
-                'bases': bases,
-                'decorators': decorators,
-                'class_vars': class_vars,
-                'docstring': ast.get_docstring(n),
-                'metaclass': metaclass,
-                'node': n,
-                'is_dataclass': is_dataclass,
-                'is_protocol': any(base == 'Protocol' for base in bases)
+                continue
+
+    # Process return annotation
+    try:
+        returns = f" -> {visitor.code(n.returns)}" if n.returns else ""
+    except Exception:
+        returns = ""
+
+    # Process decorators
+    try:
+        decorators = [extract_decorator(d, visitor.code) for d in n.decorator_list]
+        # Analyze special decorators
+        for decorator in n.decorator_list:
+            if isinstance(decorator, ast.Name):
+                if decorator.id == 'property':
+                    visitor.bucket('property_decorators').add(n.name)
+                elif decorator.id == 'staticmethod':
+                    visitor.bucket('static_methods').add(n.name)
+                elif decorator.id == 'classmethod':
+                    visitor.bucket('class_methods').add(n.name)
+                elif decorator.id == 'abstractmethod':
+                    visitor.bucket('abstract_methods').add(n.name)
+            elif isinstance(decorator, ast.Call):
+                visitor.bucket('decorators_with_args')[n.name] = extract_decorator(decorator, visitor.code)
+    except Exception:
+        decorators = []
+
+    # Register as a nested function of every enclosing function
+    if visitor.functions:
+        nested_info = {
+            'is_async': is_async,
+            'args': [a.arg for a in n.args.args],
+            'decorators': [extract_decorator(d, visitor.code) for d in n.decorator_list],
+            'docstring': ast.get_docstring(n),
+            'body': n.body,
+            'node': n,
+            'returns': visitor.code(n.returns) if n.returns else None
+        }
+        for func in visitor.functions:
+            visitor.function_info[func]['nested_functions'][n.name] = nested_info
+
+    # Body-dependent fields are filled in as the body is visited
+    func_info = {
+        'args': args,
+        'returns': returns,
+        'decorators': decorators,
+        'is_async': is_async,
+        'body': n.body,
+        'docstring': ast.get_docstring(n),
+        'nested_functions': {},
+        'node': n,
+        'is_generator': False,
+        'has_async_with': False,
+        'has_async_for': False
+    }
+    visitor.function_info[n] = func_info
+
+    if is_async:
+        visitor.bucket('async_functions')[n.name] = func_info
+    else:
+        visitor.bucket('functions')[n.name] = func_info
+
+    visitor.bucket('decorators').update(decorators)
+
+@register_structure_handler(ast.Yield, ast.YieldFrom, provides=('functions', 'async_functions'))
+def _flag_generator(visitor: StructureVisitor, n: ast.AST) -> None:
+    for func in visitor.functions:
+        visitor.function_info[func]['is_generator'] = True
+
+@register_structure_handler(ast.AsyncWith, provides=('functions', 'async_functions'))
+def _flag_async_with(visitor: StructureVisitor, n: ast.AsyncWith) -> None:
+    for func in visitor.functions:
+        visitor.function_info[func]['has_async_with'] = True
+
+@register_structure_handler(ast.AsyncFor, provides=('functions', 'async_functions'))
+def _flag_async_for(visitor: StructureVisitor, n: ast.AsyncFor) -> None:
+    for func in visitor.functions:
+        visitor.function_info[func]['has_async_for'] = True
+
+@register_structure_handler(ast.Yield, ast.YieldFrom, provides=('yield_exprs',))
+def _visit_yield(visitor: StructureVisitor, n: ast.AST) -> None:
+    expr = visitor.code(n) if visitor.functions else None
+    for func in visitor.functions:
+        visitor.add_function_entry('yield_exprs', func, {
+            'func_name': func.name,
+            'expr': expr
+        })
+
+@register_structure_handler(ast.Await, provides=('await_exprs',))
+def _visit_await(visitor: StructureVisitor, n: ast.Await) -> None:
+    expr = visitor.code(n) if visitor.functions else None
+    for func in visitor.functions:
+        visitor.add_function_entry('await_exprs', func, {
+            'func_name': func.name,
+            'expr': expr
+        })
+
+@register_structure_handler(ast.Global, provides=('global_vars',))
+def _visit_global(visitor: StructureVisitor, n: ast.Global) -> None:
+    if visitor.functions:
+        visitor.bucket('global_vars', scope=visitor.functions[-1]).update(n.names)
+
+@register_structure_handler(ast.Nonlocal, provides=('nonlocal_vars',))
+def _visit_nonlocal(visitor: StructureVisitor, n: ast.Nonlocal) -> None:
+    if visitor.functions:
+        visitor.bucket('nonlocal_vars', scope=visitor.functions[-1]).update(n.names)
+
+@register_structure_handler(ast.AsyncWith, provides=('async_with',))
+def _visit_function_async_with(visitor: StructureVisitor, n: ast.AsyncWith) -> None:
+    if not visitor.functions:
+        return
+    items = [visitor.code(item) for item in n.items]
+    body = [visitor.code(stmt) for stmt in n.body]
+    for func in visitor.functions:
+        visitor.add_function_entry('async_with', func, {
+            'func_name': func.name,
+            'items': items,
+            'body': body
+        })
+
+@register_structure_handler(ast.AsyncFor, provides=('async_for',))
+def _visit_async_for(visitor: StructureVisitor, n: ast.AsyncFor) -> None:
+    if not visitor.functions:
+        return
+    target = visitor.code(n.target)
+    iter_str = visitor.code(n.iter)
+    body = [visitor.code(stmt) for stmt in n.body]
+    for func in visitor.functions:
+        visitor.add_function_entry('async_for', func, {
+            'func_name': func.name,
+            'target': target,
+            'iter': iter_str,
+            'body': body
+        })
+
+@register_structure_handler(ast.ClassDef, provides=('classes', 'dataclasses', 'nested_classes', 'decorators'))
+def _visit_class(visitor: StructureVisitor, n: ast.ClassDef) -> None:
+    methods = []
+    async_methods = []
+    class_vars = []
+    decorators = [extract_decorator(d, visitor.code) for d in n.decorator_list]
+
+    # Check for dataclass
+    is_dataclass = any(d.id == 'dataclass' for d in n.decorator_list if isinstance(d, ast.Name))
+
+    # Process class body
+    for item in n.body:
+        if isinstance(item, ast.FunctionDef):
+            method_info = {
+                'name': item.name,
+                'decorators': [extract_decorator(d, visitor.code) for d in item.decorator_list],
+                'is_property': any(d.id == 'property' for d in item.decorator_list if isinstance(d, ast.Name)),
+                'is_classmethod': any(d.id == 'classmethod' for d in item.decorator_list if isinstance(d, ast.Name)),
+                'is_staticmethod': any(d.id == 'staticmethod' for d in item.decorator_list if isinstance(d, ast.Name)),
+                'is_abstract': any(d.id == 'abstractmethod' for d in item.decorator_list if isinstance(d, ast.Name)),
+                'body': item.body,
+                'node': item,
+                'args': [a.arg for a in item.args.args],
+                'returns': visitor.code(item.returns) if item.returns else None
             }
-            
-            structures['decorators'].update(decorators)
-    
-    # Analyze comprehensions and generators
-    for n in ast.walk(node):
-        if isinstance(n, (ast.ListComp, ast.SetComp, ast.DictComp)):
-            structures['comprehensions'].append({
-                'type': type(n).__name__,
-                'code': ast.unparse(n)
-            })
-        elif isinstance(n, ast.GeneratorExp):
-            structures['generators'].append({
-                'code': ast.unparse(n)
-            })
-        elif isinstance(n, ast.Lambda):
-            structures['lambda_funcs'].append({
-                'args': [ast.unparse(arg) for arg in n.args.args],
-                'body': ast.unparse(n.body)
-            })
-    
-    # Analyze match statements (Python 3.10+)
-    for n in ast.walk(node):
-        if hasattr(ast, 'Match') and isinstance(n, ast.Match):
-            structures['match_cases'].append({
-                'subject': ast.unparse(n.subject),
-                'cases': [{
-                    'pattern': ast.unparse(case.pattern),
-                    'guard': ast.unparse(case.guard) if case.guard else None,
-                    'body': [ast.unparse(stmt) for stmt in case.body]
-                } for case in n.cases]
-            })
-    
-    # Analyze context managers (with blocks)
-    for n in ast.walk(node):
-        if isinstance(n, ast.With):
-            structures['with_blocks'].append({
-                'items': [ast.unparse(item) for item in n.items],
-                'body': [ast.unparse(stmt) for stmt in n.body]
-            })
-        elif isinstance(n, ast.AsyncWith):
-            structures['async_with'].append({
-                'items': [ast.unparse(item) for item in n.items],
-                'body': [ast.unparse(stmt) for stmt in n.body]
-            })
-    
-    # Analyze try-except blocks
-    for n in ast.walk(node):
-        if isinstance(n, ast.Try):
-            structures['try_blocks'].append({
-                'body': [ast.unparse(stmt) for stmt in n.body],
-                'handlers': [{
-                    'type': ast.unparse(handler.type) if handler.type else None,
-                    'name': handler.name,
-                    'body': [ast.unparse(stmt) for stmt in handler.body]
-                } for handler in n.handlers],
-                'finally_body': [ast.unparse(stmt) for stmt in n.finalbody] if n.finalbody else None,
-                'else_body': [ast.unparse(stmt) for stmt in n.orelse] if n.orelse else None
-            })
-    
-    # Analyze f-strings
-    for n in ast.walk(node):
-        if isinstance(n, ast.JoinedStr):
-            structures['f_strings'].append({
-                'code': ast.unparse(n)
+            methods.append(method_info)
+        elif isinstance(item, ast.AsyncFunctionDef):
+            async_methods.append({
+                'name': item.name,
+                'decorators': [extract_decorator(d, visitor.code) for d in item.decorator_list],
+                'body': item.body,
+                'node': item,
+                'args': [a.arg for a in item.args.args],
+                'returns': visitor.code(item.returns) if item.returns else None
             })
-    
-    # Analyze type comments
-    for n in ast.walk(node):
-        if hasattr(n, 'type_comment') and n.type_comment:
-            structures['type_comments'][ast.unparse(n)] = n.type_comment
-    
-    return structures
+        elif isinstance(item, ast.AnnAssign):
+            if isinstance(item.target, ast.Name):
+                annotation = visitor.code(item.annotation)
+                value = visitor.code(item.value) if item.value else None
+                is_classvar = (
+                    isinstance(item.annotation, ast.Subscript) and
+                    isinstance(item.annotation.value, ast.Name) and
+                    item.annotation.value.id == 'ClassVar'
+                )
+                is_dataclass_field = (
+                    is_dataclass and
+                    isinstance(item.annotation, ast.Call) and
+                    isinstance(item.annotation.func, ast.Name) and
+                    item.annotation.func.id == 'field'
+                )
+
+                class_vars.append({
+                    'name': item.target.id,
+                    'type': annotation,
+                    'value': value,
+                    'is_class_var': is_classvar,
+                    'is_dataclass_field': is_dataclass_field
+                })
+
+                if is_dataclass_field:
+                    visitor.bucket('dataclasses')[item.target.id] = {
+                        'type': annotation,
+                        'default': value,
+                        'metadata': {
+                            k.arg: visitor.code(k.value)
+                            for k in item.annotation.keywords
+                        }
+                    }
+        elif isinstance(item, ast.ClassDef):
+            visitor.bucket('nested_classes')[item.name] = visitor.subtree(item)
+
+    # Process metaclass
+    metaclass = None
+    for keyword in n.keywords:
+        if keyword.arg == 'metaclass':
+            metaclass = visitor.code(keyword.value)
+
+    # Process bases with generic types
+    bases = []
+    for base in n.bases:
+        if isinstance(base, ast.Name):
+            bases.append(base.id)
+        elif isinstance(base, ast.Subscript):  # Generic types like List[int]
+            bases.append(visitor.code(base))
+        else:
+            bases.append(visitor.code(base))
+
+    visitor.bucket('classes')[n.name] = {
+        'methods': methods,
+        'async_methods': async_methods,
+        'bases': bases,
+        'decorators': decorators,
+        'class_vars': class_vars,
+        'docstring': ast.get_docstring(n),
+        'metaclass': metaclass,
+        'node': n,
+        'is_dataclass': is_dataclass,
+        'is_protocol': any(base == 'Protocol' for base in bases)
+    }
+
+    visitor.bucket('decorators').update(decorators)
+
+@register_structure_handler(ast.ListComp, ast.SetComp, ast.DictComp, provides=('comprehensions',))
+def _visit_comprehension(visitor: StructureVisitor, n: ast.AST) -> None:
+    visitor.bucket('comprehensions').append({
+        'type': type(n).__name__,
+        'code': visitor.code(n)
+    })
+
+@register_structure_handler(ast.GeneratorExp, provides=('generators',))
+def _visit_generator(visitor: StructureVisitor, n: ast.GeneratorExp) -> None:
+    visitor.bucket('generators').append({
+        'code': visitor.code(n)
+    })
+
+@register_structure_handler(ast.Lambda, provides=('lambda_funcs',))
+def _visit_lambda(visitor: StructureVisitor, n: ast.Lambda) -> None:
+    visitor.bucket('lambda_funcs').append({
+        'args': [visitor.code(arg) for arg in n.args.args],
+        'body': visitor.code(n.body)
+    })
+
+if hasattr(ast, 'Match'):
+    @register_structure_handler(ast.Match, provides=('match_cases',))
+    def _visit_match(visitor: StructureVisitor, n: ast.AST) -> None:
+        """Analyze match statements (Python 3.10+)."""
+        visitor.bucket('match_cases').append({
+            'subject': visitor.code(n.subject),
+            'cases': [{
+                'pattern': visitor.code(case.pattern),
+                'guard': visitor.code(case.guard) if case.guard else None,
+                'body': [visitor.code(stmt) for stmt in case.body]
+            } for case in n.cases]
+        })
+
+@register_structure_handler(ast.With, provides=('with_blocks',))
+def _visit_with(visitor: StructureVisitor, n: ast.With) -> None:
+    visitor.bucket('with_blocks').append({
+        'items': [visitor.code(item) for item in n.items],
+        'body': [visitor.code(stmt) for stmt in n.body]
+    })
+
+@register_structure_handler(ast.AsyncWith, provides=('async_with',))
+def _visit_async_with(visitor: StructureVisitor, n: ast.AsyncWith) -> None:
+    visitor.bucket('async_with').append({
+        'items': [visitor.code(item) for item in n.items],
+        'body': [visitor.code(stmt) for stmt in n.body]
+    })
+
+@register_structure_handler(ast.Try, provides=('try_blocks',))
+def _visit_try(visitor: StructureVisitor, n: ast.Try) -> None:
+    visitor.bucket('try_blocks').append({
+        'body': [visitor.code(stmt) for stmt in n.body],
+        'handlers': [{
+            'type': visitor.code(handler.type) if handler.type else None,
+            'name': handler.name,
+            'body': [visitor.code(stmt) for stmt in handler.body]
+        } for handler in n.handlers],
+        'finally_body': [visitor.code(stmt) for stmt in n.finalbody] if n.finalbody else None,
+        'else_body': [visitor.code(stmt) for stmt in n.orelse] if n.orelse else None
+    })
+
+@register_structure_handler(ast.JoinedStr, provides=('f_strings',))
+def _visit_f_string(visitor: StructureVisitor, n: ast.JoinedStr) -> None:
+    visitor.bucket('f_strings').append({
+        'code': visitor.code(n)
+    })
+
+@register_structure_handler(
+    ast.FunctionDef, ast.AsyncFunctionDef, ast.Assign, ast.For,
+    ast.AsyncFor, ast.With, ast.AsyncWith, ast.arg,
+    provides=('type_comments',)
+)
+def _visit_type_comment(visitor: StructureVisitor, n: ast.AST) -> None:
+    if getattr(n, 'type_comment', None):
+        visitor.bucket('type_comments')[visitor.code(n)] = n.type_comment
+
+def analyze_complex_structures(
+    node: ast.AST,
+    source_code: Union[SourceFile, str] = '',
+    cache: Optional[StructureVisitor] = None
+) -> Mapping:
+    """Analyze complex code structures like nested classes and functions.
+
+    Args:
+        node: AST node to analyze
+        source_code: Original source code for preserving formatting
+        cache: Optional visitor that has already visited a tree containing
+            ``node``; its memoized results are reused
+
+    Returns:
+        Mapping of analysis results, each category built on first access
+    """
+    if cache is None or node not in cache:
+        cache = StructureVisitor(source_code)
+        cache.visit(node)
+    return cache.get(node)
 
 def get_parent_class(node: ast.ClassDef, tree: ast.AST) -> Optional[ast.ClassDef]:
     """Get the parent class node for a given class node."""
-    for parent in ast.walk(tree):
-        if isinstance(parent, ast.ClassDef):
-            for child in ast.walk(parent):
-                if child == node and child is not parent:
-                    return parent
-    return None
+    return get_scope_index(tree).get_parent_class(node)
 
 def is_node_in_function_or_class(node: ast.AST, tree: ast.AST) -> bool:
     """Check if a node is inside a function or class definition."""
-    return get_parent_function_or_class(node, tree) is not None 
\ No newline at end of file
+    return get_scope_index(tree).get_scope(node) is not None 
\ No newline at end of file
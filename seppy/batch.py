@@ -0,0 +1,351 @@
+import os
+import re
+import json
+import time
+import concurrent.futures
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from .core import Seppy, load_config
+from .cache import AnalysisCache
+from .config import MIN_THREADS, MAX_THREADS, MIN_MEMORY_LIMIT, MEMORY_SOFT_LIMIT, OUTPUT_INDEX_NAME
+from .models import FileResult, ProcessingStats
+from .writer import OutputWriter
+from .memory import MemoryGovernor, get_memory_limit
+from .ignore import scan_tree, translate_pattern
+from .utils import logger
+
+def has_magic(pattern: str) -> bool:
+    """Check whether a path contains glob wildcards."""
+    return any(char in pattern for char in '*?[')
+
+def _glob_base(pattern: str) -> Path:
+    """Get the directory before the first wildcard of a glob pattern."""
+    parts = []
+    for part in Path(pattern).parts:
+        if has_magic(part):
+            break
+        parts.append(part)
+    return Path(*parts) if parts else Path('.')
+
+def discover_sources(
+    inputs: List[str],
+    ignore_patterns: Sequence[str] = (),
+    use_gitignore: bool = False,
+    exclude: Sequence[Union[str, Path]] = ()
+) -> List[Tuple[Path, Path]]:
+    """Find the Python files named by files, directories and glob patterns.
+
+    Directories and glob patterns are scanned with scan_tree, so ignored
+    directories are skipped without being listed. Files named explicitly
+    are never ignored.
+
+    Args:
+        inputs: Paths of files or directories, or glob patterns
+            (``**`` matches any number of directories)
+        ignore_patterns: Patterns in gitignore syntax, relative to each
+            scanned directory or glob base
+        use_gitignore: Also honor .gitignore files found while scanning
+        exclude: Directories never scanned, such as the output and cache
+            directories, so a run does not pick up its own outputs
+
+    Returns:
+        Sorted list of (source file, output subdirectory) pairs. The output
+        subdirectory is the file's path relative to the directory or glob
+        base it was found under, without the ``.py`` suffix.
+
+    Raises:
+        FileNotFoundError: If an input matches nothing
+    """
+    found: Dict[Path, Path] = {}
+    for item in inputs:
+        if has_magic(item):
+            base = _glob_base(item)
+            rest = '/'.join(Path(item).parts[len(base.parts):]) if base != Path('.') else '/'.join(Path(item).parts)
+            regex = re.compile(translate_pattern(rest))
+            max_depth = None if '**' in rest else rest.count('/')
+            candidates = [
+                (path, Path(relative))
+                for path, relative in scan_tree(str(base), ignore_patterns, use_gitignore, max_depth=max_depth, exclude=exclude)
+                if regex.fullmatch(relative)
+            ]
+            if not candidates:
+                raise FileNotFoundError(f"No Python files match: {item}")
+        elif os.path.isdir(item):
+            candidates = [
+                (path, Path(relative))
+                for path, relative in scan_tree(item, ignore_patterns, use_gitignore, exclude=exclude)
+            ]
+        elif os.path.isfile(item):
+            path = Path(item)
+            candidates = [(path, Path(path.name))]
+        else:
+            raise FileNotFoundError(f"File not found: {item}")
+
+        for path, relative in candidates:
+            found.setdefault(path.resolve(), relative.with_suffix(''))
+
+    # Two inputs may map different files to the same subdirectory
+    jobs = []
+    used = set()
+    for path, relative in sorted(found.items(), key=lambda item: (str(item[1]), str(item[0]))):
+        target = relative
+        counter = 2
+        while target in used:
+            target = relative.with_name(f"{relative.name}_{counter}")
+            counter += 1
+        used.add(target)
+        jobs.append((path, target))
+    return jobs
+
+def process_file(
+    source_file: str,
+    output_dir: str,
+    config_file: Optional[str] = None,
+    memory_limit_mb: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    source_hash: Optional[str] = None,
+    incremental: bool = False
+) -> FileResult:
+    """Split one file and save its modules, capturing any failure."""
+    start_time = time.time()
+    result = FileResult(source=source_file, output=output_dir)
+    try:
+        splitter = Seppy(
+            source_file=source_file,
+            config_file=config_file,
+            memory_limit_mb=memory_limit_mb,
+            cache_dir=cache_dir
+        )
+        # Files are already spread over processes
+        splitter.config["PARALLEL_BUILD"] = False
+        # The parent maintains the cache and the fingerprint index once,
+        # after the whole batch
+        splitter.cache.deferred = True
+        if incremental:
+            splitter.split_incremental(output_dir)
+            result.modules = splitter.stats.total_modules
+        else:
+            modules = splitter.split(output_dir, source_hash)
+            result.modules = len(modules)
+            result.source_hash = splitter.source_hash
+        result.cache_bytes = splitter.cache.written
+    except Exception as e:
+        result.error = str(e) or type(e).__name__
+    result.processing_time = time.time() - start_time
+    return result
+
+def get_worker_count(jobs: int, workers: Optional[int] = None) -> int:
+    """Get the number of processes for a batch of files."""
+    if workers is None:
+        workers = os.cpu_count() or MIN_THREADS
+    return max(MIN_THREADS, min(workers, MAX_THREADS, jobs))
+
+def process_files(
+    jobs: List[Tuple[Path, Path]],
+    output_dir: str,
+    config_file: Optional[str] = None,
+    memory_limit_mb: Optional[int] = None,
+    workers: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    incremental: bool = False
+) -> List[FileResult]:
+    """Split many files concurrently, each into its own output subdirectory.
+
+    A failing file is reported in its result and does not stop the batch.
+    With caching enabled, the content hashes of files whose stat data is
+    unchanged are taken from the fingerprint index, so their workers can
+    load the cached result without reading them; the index is updated
+    and the cache maintained (see AnalysisCache.maintain) once, after the
+    whole batch.
+
+    The memory limit covers the whole batch: it is split evenly between the
+    worker processes, each enforcing its share, and there are only as many
+    workers as get MIN_MEMORY_LIMIT each. The parent also samples the
+    memory of the whole pool and, above MEMORY_SOFT_LIMIT of the limit,
+    halves the number of files split at the same time.
+
+    Args:
+        jobs: (source file, output subdirectory) pairs from discover_sources
+        output_dir: Root output directory
+        config_file: Optional path to configuration file
+        memory_limit_mb: Optional memory limit override for the whole batch
+        workers: Number of processes (default: CPU count, at most MAX_THREADS)
+        cache_dir: Optional cache directory override, shared by all processes
+        incremental: Regenerate only changed definitions (Seppy.split_incremental)
+
+    Returns:
+        Results in the order of ``jobs``
+    """
+    output_root = Path(output_dir)
+    cache = fingerprints = None
+    config = load_config(config_file)
+    if config["CACHE_ENABLED"]:
+        cache = AnalysisCache.from_config(config, cache_dir)
+        fingerprints = cache.fingerprints
+    stats = [fingerprints.stat(source) if fingerprints else None for source, _ in jobs]
+    hashes = [
+        fingerprints.lookup(source, stat) if fingerprints else None
+        for (source, _), stat in zip(jobs, stats)
+    ]
+    limit_mb = get_memory_limit(memory_limit_mb if memory_limit_mb is not None else config["MEMORY_LIMIT_MB"])
+    count = get_worker_count(len(jobs), workers)
+    fitting = max(MIN_THREADS, limit_mb // MIN_MEMORY_LIMIT)
+    if count > fitting:
+        if workers is not None:
+            logger.warning(
+                f"Running {fitting} of the {workers} requested workers: each needs at least "
+                f"{MIN_MEMORY_LIMIT} MB of the {limit_mb} MB memory limit of the batch"
+            )
+        count = fitting
+    workers = count
+    tasks = [
+        (str(source), str(output_root / relative), config_file, limit_mb // workers, cache_dir, source_hash, incremental)
+        for (source, relative), source_hash in zip(jobs, hashes)
+    ]
+    results: List[Optional[FileResult]] = [None] * len(tasks)
+    if workers == 1:
+        for i, task in enumerate(tasks):
+            results[i] = _report(process_file(*task))
+    else:
+        memory = MemoryGovernor(limit_mb, include_children=True)
+        active = workers
+        queued = iter(enumerate(tasks))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures: Dict[concurrent.futures.Future, int] = {}
+            while True:
+                # Keep at most ``active`` files in flight
+                while len(futures) < active:
+                    item = next(queued, None)
+                    if item is None:
+                        break
+                    futures[executor.submit(process_file, *item[1])] = item[0]
+                if not futures:
+                    break
+                done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    i = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # The worker process itself failed
+                        result = FileResult(source=tasks[i][0], output=tasks[i][1], error=str(e) or type(e).__name__)
+                    results[i] = _report(result)
+
+                rss = memory.sample()
+                if active > 1 and rss >= limit_mb * MEMORY_SOFT_LIMIT:
+                    active = max(MIN_THREADS, active // 2)
+                    logger.warning(
+                        f"Memory usage of {rss} MB is close to the limit of {limit_mb} MB, "
+                        f"splitting {active} files at a time"
+                    )
+
+    if fingerprints is not None:
+        for (source, _), stat, source_hash, result in zip(jobs, stats, hashes, results):
+            if source_hash is None and result.source_hash is not None:
+                fingerprints.record(source, stat, result.source_hash)
+        fingerprints.save()
+        cache.maintain(sum(result.cache_bytes for result in results))
+    return results
+
+def _report(result: FileResult) -> FileResult:
+    """Log the outcome of one file."""
+    if result.error:
+        logger.error(f"Failed to process {result.source}: {result.error}")
+    else:
+        logger.info(f"Processed {result.source}: {result.modules} modules")
+    return result
+
+def get_input_root(item: str) -> Path:
+    """Get the directory a file, directory or glob pattern input lives in."""
+    if has_magic(item):
+        return _glob_base(item)
+    path = Path(item)
+    return path if path.is_dir() else path.parent
+
+def load_index(output_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Load the per-file entries of the batch index in an output directory."""
+    path = Path(output_dir) / OUTPUT_INDEX_NAME
+    try:
+        with open(path, encoding='utf-8') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable batch index {path}: {e}")
+        return {}
+    files = index.get('files') if isinstance(index, dict) else None
+    return files if isinstance(files, dict) else {}
+
+def _read_entry(source: Path, output_dir: Path) -> Optional[Dict[str, Any]]:
+    """Read the index entry of a file from its output subdirectory."""
+    try:
+        with open(output_dir / "dependencies.json", encoding='utf-8') as f:
+            dependencies = json.load(f)
+        modules = sorted(entry.name[:-3] for entry in os.scandir(output_dir / "docs") if entry.name.endswith('.md'))
+    except (OSError, ValueError):
+        return None
+    return {'source': str(source), 'modules': modules, 'dependencies': dependencies}
+
+def update_index(
+    output_dir: str,
+    jobs: List[Tuple[Path, Path]],
+    results: List[FileResult],
+    stats: Optional[ProcessingStats] = None
+) -> Dict[str, Dict[str, Any]]:
+    """Write the combined dependency graph and documentation index of a batch.
+
+    ``dependencies.json`` in the output directory maps the output
+    subdirectory of every file to its dependency graph, and ``index.md``
+    links the documentation of every module. Both are generated from
+    OUTPUT_INDEX_NAME, which is merged: files split in this run are read
+    from their output subdirectories, all other files keep the entry of
+    the previous run, and files that are no longer part of the batch are
+    dropped. A run over a few changed files therefore only reads their
+    outputs.
+
+    Args:
+        output_dir: Root output directory
+        jobs: Every (source file, output subdirectory) pair of the batch
+        results: Results of the files split in this run
+        stats: Optional statistics to record write errors in
+
+    Returns:
+        The index entries, by output subdirectory
+    """
+    output_root = Path(output_dir)
+    previous = load_index(output_dir)
+    processed = {result.source: result for result in results}
+    files: Dict[str, Dict[str, Any]] = {}
+    for source, relative in jobs:
+        key = relative.as_posix()
+        result = processed.get(str(source))
+        entry = None
+        if result is not None and not result.error:
+            entry = _read_entry(source, output_root / relative)
+        if entry is None:
+            entry = previous.get(key)
+            if entry is None or entry.get('source') != str(source):
+                entry = _read_entry(source, output_root / relative)
+        if entry is not None:
+            files[key] = entry
+
+    def render_index() -> str:
+        lines = ["# Module Index", ""]
+        for key, entry in files.items():
+            lines.append(f"## {key}")
+            lines.append("")
+            lines.extend(f"- [{name}]({key}/docs/{name}.md)" for name in entry['modules'])
+            lines.append("")
+        return "\n".join(lines)
+
+    with OutputWriter(output_root, MIN_THREADS, stats) as writer:
+        writer.submit(
+            "dependencies.json",
+            lambda: json.dumps({key: entry['dependencies'] for key, entry in files.items()}, indent=2),
+            "combined dependency graph"
+        )
+        writer.submit("index.md", render_index, "documentation index")
+        writer.submit(OUTPUT_INDEX_NAME, lambda: json.dumps({'files': files}, indent=2), "batch index")
+    return files
+
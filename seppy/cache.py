@@ -0,0 +1,622 @@
+import os
+import ast
+import json
+import mmap
+import time
+import hashlib
+import secrets
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, Union
+
+from .analyzers import iter_module_statements, get_bound_names
+from .config import (
+    CACHE_VERSION, CACHE_DIR_NAME, CACHE_DIR_ENV, MAX_CACHE_SIZE,
+    CACHE_CLEANUP_THRESHOLD, CACHE_CLEANUP_TARGET, MMAP_THRESHOLD
+)
+from .exceptions import CacheError
+from .models import AnalysisResult, ModuleInfo
+from .records import dump_result, dump_module, load_record
+from .source import SourceFile
+from .utils import logger
+
+# Configuration keys that change the analysis result of a file
+CACHE_CONFIG_KEYS = ("IGNORE_PATTERNS", "PRESERVE_FORMATTING", "ANALYSIS_CONFIG")
+
+# Temporary files left behind by interrupted writes are removed after this long
+TEMP_FILE_MAX_AGE = 3600  # seconds
+
+# Name of the stat-based fingerprint index inside the cache directory
+FINGERPRINT_INDEX_NAME = 'fingerprints.json'
+
+# Name of the file tracking the total entry size inside the cache directory
+USAGE_FILE_NAME = 'usage.json'
+
+# Expired entries are looked for at most this often
+EXPIRY_INTERVAL = 86400  # seconds
+
+# Files modified less than this long ago are not fingerprinted by stat data,
+# a later change within the same timestamp granularity would go unnoticed
+FINGERPRINT_RACY_WINDOW = 2  # seconds
+
+def write_atomic(path: Path, data: bytes, temp_suffix: str = '.tmp') -> None:
+    """Write a file through a temporary file renamed into place.
+
+    Readers see either the previous or the new contents, never a partial
+    file. The file is created with the process umask applied, like any
+    other file, so a shared cache stays readable by its other users.
+
+    Raises:
+        OSError: If the file cannot be written; the temporary file is removed
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.parent / f".{path.name}.{secrets.token_hex(8)}{temp_suffix}"
+    fd = os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+def get_cache_dir(
+    config: Mapping[str, Any],
+    override: Optional[Union[str, Path]] = None
+) -> Path:
+    """Resolve the cache directory.
+
+    In order of precedence: ``override`` (e.g. the ``--cache-dir`` flag),
+    the SEPPY_CACHE_DIR environment variable, CACHE_CONFIG.DIRECTORY and
+    CACHE_DIR_NAME in the current working directory.
+    """
+    directory = (
+        override
+        or os.environ.get(CACHE_DIR_ENV)
+        or (config.get("CACHE_CONFIG") or {}).get("DIRECTORY")
+        or CACHE_DIR_NAME
+    )
+    return Path(os.path.expanduser(str(directory)))
+
+# Entries are keyed by the source hash, CACHE_VERSION and the relevant
+# configuration, and written through a temporary file renamed into place, so
+# any number of processes can share a directory without locks. A cache that
+# cannot be read or written is logged and treated as a miss. The total size
+# is tracked in USAGE_FILE_NAME and only rescanned by maintain when eviction
+# or expiry may be due; batch workers set ``deferred`` and leave maintenance
+# and the fingerprint index to their parent.
+class AnalysisCache:
+    """Content-addressed on-disk cache of analysis results."""
+
+    ENTRY_SUFFIX = '.sepc'
+    TEMP_SUFFIX = '.tmp'
+    # Entries of earlier cache formats, only kept around for eviction
+    LEGACY_SUFFIXES = ('.pickle',)
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path],
+        max_size: int = MAX_CACHE_SIZE,
+        max_age_days: Optional[float] = None
+    ):
+        """Initialize cache.
+
+        Args:
+            cache_dir: Directory holding the cache entries
+            max_size: Size limit of the cache in bytes
+            max_age_days: Optional age after which unused entries are evicted
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+        self.max_age_days = max_age_days
+        # Net bytes written and not yet added to the usage file
+        self.written = 0
+        # Leave maintain and the fingerprint index to another process,
+        # e.g. the parent of batch workers
+        self.deferred = False
+        self._size: Optional[int] = None
+        self._fingerprints: Optional['FingerprintIndex'] = None
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Mapping[str, Any],
+        cache_dir: Optional[Union[str, Path]] = None
+    ) -> 'AnalysisCache':
+        """Create a cache with the directory and limits of CACHE_CONFIG.
+
+        Args:
+            config: Configuration
+            cache_dir: Optional directory overriding the configured one
+        """
+        cache_config = config.get("CACHE_CONFIG") or {}
+        max_size_mb = cache_config.get("MAX_SIZE_MB")
+        return cls(
+            get_cache_dir(config, cache_dir),
+            max_size=int(max_size_mb * 1024 * 1024) if max_size_mb else MAX_CACHE_SIZE,
+            max_age_days=cache_config.get("EXPIRATION_DAYS")
+        )
+
+    @staticmethod
+    def make_key(source_hash: str, config: Mapping[str, Any]) -> str:
+        """Get the cache key of a source file under a configuration."""
+        relevant = {key: config.get(key) for key in CACHE_CONFIG_KEYS}
+        payload = json.dumps(
+            {'source': source_hash, 'version': CACHE_VERSION, 'config': relevant},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @property
+    def fingerprints(self) -> 'FingerprintIndex':
+        """Stat-based fingerprint index of the source files seen by this cache."""
+        if self._fingerprints is None:
+            self._fingerprints = FingerprintIndex(self.cache_dir / FINGERPRINT_INDEX_NAME)
+        return self._fingerprints
+
+    def path(self, key: str) -> Path:
+        """Get the path of a cache entry."""
+        return self.cache_dir / f"{key}{self.ENTRY_SUFFIX}"
+
+    def definition_path(self, key: str) -> Path:
+        """Get the path of a definition cache entry."""
+        return self.cache_dir / "definitions" / f"{key}{self.ENTRY_SUFFIX}"
+
+    def load(self, key: str) -> Optional[AnalysisResult]:
+        """Load the analysis result of a file.
+
+        Returns:
+            Cached result, or None on a miss
+        """
+        return self._load(self.path(key), AnalysisResult)
+
+    def store(self, key: str, result: AnalysisResult) -> bool:
+        """Store the analysis result of a file.
+
+        Returns:
+            True if the entry was written
+        """
+        return self._store(self.path(key), dump_result(result))
+
+    def load_definition(self, key: str) -> Optional[ModuleInfo]:
+        """Load the module built for a definition."""
+        return self._load(self.definition_path(key), ModuleInfo)
+
+    def store_definition(self, key: str, module: ModuleInfo) -> bool:
+        """Store the module built for a definition."""
+        return self._store(self.definition_path(key), dump_module(module))
+
+    def _load(self, path: Path, expected: type) -> Any:
+        """Load an entry of the expected type, or None.
+
+        Entries of at least MMAP_THRESHOLD bytes are read through a memory map.
+        """
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size >= MMAP_THRESHOLD:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        value = load_record(mapped)
+                else:
+                    value = load_record(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, CacheError, BufferError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+        if not isinstance(value, expected):
+            logger.warning(f"Ignoring invalid cache entry {path}")
+            return None
+        self._touch(path)
+        return value
+
+    def _store(self, path: Path, data: bytes) -> bool:
+        """Write an entry atomically, logging failures."""
+        try:
+            try:
+                previous = path.stat().st_size
+            except FileNotFoundError:
+                previous = 0
+            write_atomic(path, data, self.TEMP_SUFFIX)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {path}: {e}")
+            return False
+        self._account(len(data) - previous)
+        return True
+
+    @staticmethod
+    def _touch(path: Path) -> None:
+        """Mark an entry as recently used."""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _account(self, delta: int) -> None:
+        """Track written bytes and maintain the cache once it may be full."""
+        self.written += delta
+        if self.deferred:
+            return
+        if self._size is None:
+            usage = self._read_usage()
+            self._size = usage['size'] if usage is not None else 0
+        if self._size + self.written > self.max_size * CACHE_CLEANUP_THRESHOLD:
+            self.maintain()
+
+    def maintain(self, added: int = 0) -> None:
+        """Add the bytes written in this run to the usage file and evict if needed.
+
+        The entries are only scanned if the usage file is missing, the
+        size crosses CACHE_CLEANUP_THRESHOLD of ``max_size``, or the last
+        expiry is EXPIRY_INTERVAL ago. Does nothing if ``deferred`` is set.
+
+        Args:
+            added: Bytes written by other processes, such as batch workers
+        """
+        if self.deferred:
+            return
+        usage = self._read_usage()
+        if usage is None:
+            usage = {'size': self.stats()['size'], 'expired': 0.0}
+        else:
+            usage['size'] += self.written + added
+        self.written = 0
+        self._size = usage['size']
+
+        if usage['size'] > self.max_size * CACHE_CLEANUP_THRESHOLD:
+            self.prune()
+        elif self.max_age_days and time.time() - usage['expired'] >= EXPIRY_INTERVAL:
+            self.prune(max_size=None)
+        else:
+            self._write_usage(usage['size'], usage['expired'])
+
+    def _read_usage(self) -> Optional[Dict[str, float]]:
+        """Read the usage file, or None if it is missing or unreadable."""
+        try:
+            with open(self.cache_dir / USAGE_FILE_NAME, encoding='utf-8') as f:
+                data = json.load(f)
+            return {'size': max(0, int(data['size'])), 'expired': float(data['expired'])}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable cache usage file: {e}")
+            return None
+
+    def _write_usage(self, size: int, expired: float) -> None:
+        """Write the usage file, logging failures."""
+        if not self.cache_dir.is_dir():
+            return
+        data = json.dumps({'size': size, 'expired': expired})
+        try:
+            write_atomic(self.cache_dir / USAGE_FILE_NAME, data.encode('utf-8'), self.TEMP_SUFFIX)
+        except OSError as e:
+            logger.warning(f"Failed to write cache usage file: {e}")
+
+    def iter_entries(self, temporary: bool = False) -> Iterator[Tuple[str, int, float]]:
+        """Iterate over cache entries as (path, size, mtime).
+
+        Args:
+            temporary: Iterate over the temporary files of pending or
+                interrupted writes instead
+        """
+        suffixes = (self.TEMP_SUFFIX,) if temporary else (self.ENTRY_SUFFIX,) + self.LEGACY_SUFFIXES
+        directories = [str(self.cache_dir)]
+        while directories:
+            try:
+                with os.scandir(directories.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                directories.append(entry.path)
+                            elif entry.name.endswith(suffixes):
+                                stat = entry.stat(follow_symlinks=False)
+                                yield entry.path, stat.st_size, stat.st_mtime
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number, total size and age range of the cache entries."""
+        entries = list(self.iter_entries())
+        definitions = os.path.join(str(self.cache_dir), "definitions")
+        mtimes = [mtime for _, _, mtime in entries]
+        return {
+            'directory': str(self.cache_dir),
+            'entries': len(entries),
+            'definitions': sum(1 for path, _, _ in entries if os.path.dirname(path) == definitions),
+            'size': sum(size for _, size, _ in entries),
+            'max_size': self.max_size,
+            'oldest': min(mtimes) if mtimes else None,
+            'newest': max(mtimes) if mtimes else None
+        }
+
+    def prune(
+        self,
+        max_size: Optional[int] = -1,
+        max_age_days: Optional[float] = -1
+    ) -> Tuple[int, int]:
+        """Evict expired entries, then least recently used ones over the size target.
+
+        Args:
+            max_size: Size limit in bytes; entries are evicted down to
+                CACHE_CLEANUP_TARGET of it (default: the cache's limit,
+                None: no size limit)
+            max_age_days: Evict entries unused for longer (default: the
+                cache's expiration, None: no expiration)
+
+        Returns:
+            Tuple of (entries removed, bytes freed)
+        """
+        if max_size == -1:
+            max_size = self.max_size
+        if max_age_days == -1:
+            max_age_days = self.max_age_days
+
+        entries = sorted(self.iter_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+        target = max_size * CACHE_CLEANUP_TARGET if max_size is not None else None
+
+        # Oldest first: expired entries come before all others
+        evicted = []
+        remaining = total
+        for path, size, mtime in entries:
+            expired = cutoff is not None and mtime < cutoff
+            over = target is not None and remaining > target
+            if not expired and not over:
+                break
+            evicted.append((path, size))
+            remaining -= size
+
+        # Writes that were interrupted long ago, recent ones may still be running
+        temp_cutoff = time.time() - TEMP_FILE_MAX_AGE
+        self._remove([(path, 0) for path, _, mtime in self.iter_entries(temporary=True) if mtime < temp_cutoff])
+
+        removed, freed = self._remove(evicted)
+        self._size = total - freed
+        self.written = 0
+        usage = self._read_usage()
+        expired = time.time() if max_age_days else (usage['expired'] if usage else 0.0)
+        self._write_usage(self._size, expired)
+        self.fingerprints.prune()
+        if removed:
+            logger.info(f"Evicted {removed} cache entries ({freed / (1024 * 1024):.1f} MB)")
+        return removed, freed
+
+    def clear(self) -> Tuple[int, int]:
+        """Remove every cache entry.
+
+        Returns:
+            Tuple of (entries removed, bytes freed)
+        """
+        removed, freed = self._remove([(path, size) for path, size, _ in self.iter_entries()])
+        self._size = None
+        self.written = 0
+        try:
+            (self.cache_dir / USAGE_FILE_NAME).unlink()
+        except OSError:
+            pass
+        self.fingerprints.clear()
+        return removed, freed
+
+    @staticmethod
+    def _remove(entries: List[Tuple[str, int]]) -> Tuple[int, int]:
+        """Delete entries, skipping ones that are already gone."""
+        removed = freed = 0
+        for path, size in entries:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"Failed to evict cache entry {path}: {e}")
+                continue
+            removed += 1
+            freed += size
+        return removed, freed
+
+class FingerprintIndex:
+    """Stat-based index of source content hashes.
+
+    Maps every source file seen to its size, mtime_ns and inode together
+    with its content hash. As long as a file's stat data is unchanged, its
+    hash, and so its cache key, is known without reading the file. Updates
+    are collected in memory and merged into the index file in one write by
+    save, so processes sharing a cache only lose each other's updates in
+    the rare case of saving at the same moment.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Union[str, Path]):
+        """Initialize index.
+
+        Args:
+            path: Path of the index file
+        """
+        self.path = Path(path)
+        self._entries: Optional[Dict[str, List[Any]]] = None
+        self._updates: Dict[str, List[Any]] = {}
+
+    @staticmethod
+    def stat(path: Union[str, Path]) -> Optional[Tuple[int, int, int]]:
+        """Get the (size, mtime_ns, inode) of a file, or None if it cannot be read."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+    def lookup(self, path: Union[str, Path], stat: Optional[Tuple[int, int, int]]) -> Optional[str]:
+        """Get the content hash of a file if its stat data is unchanged."""
+        if stat is None:
+            return None
+        key = os.path.abspath(path)
+        entry = self._updates.get(key) or self._load().get(key)
+        if entry is None or tuple(entry[:3]) != stat:
+            return None
+        return entry[3]
+
+    def record(self, path: Union[str, Path], stat: Optional[Tuple[int, int, int]], digest: str) -> None:
+        """Remember the content hash of a file.
+
+        Args:
+            path: Path of the file
+            stat: Stat data taken before the file was read; nothing is
+                recorded if the file has changed since or was modified
+                too recently for its stat data to be trusted
+            digest: Content hash of what was read
+        """
+        if stat is None or self.stat(path) != stat:
+            return
+        if time.time_ns() - stat[1] < FINGERPRINT_RACY_WINDOW * 1_000_000_000:
+            return
+        self._updates[os.path.abspath(path)] = [*stat, digest]
+
+    def save(self) -> bool:
+        """Merge the recorded updates into the index file.
+
+        Returns:
+            True if the index was written
+        """
+        if not self._updates:
+            return False
+        # Re-read so updates saved by other processes in the meantime are kept
+        self._entries = None
+        entries = dict(self._load())
+        entries.update(self._updates)
+        if not self._write(entries):
+            return False
+        self._updates = {}
+        return True
+
+    def prune(self) -> int:
+        """Drop the entries of files that no longer exist.
+
+        Returns:
+            Number of entries dropped
+        """
+        self._entries = None
+        entries = self._load()
+        kept = {path: entry for path, entry in entries.items() if os.path.exists(path)}
+        dropped = len(entries) - len(kept)
+        if dropped:
+            self._write(kept)
+        return dropped
+
+    def clear(self) -> None:
+        """Remove the index file and all pending updates."""
+        self._entries = {}
+        self._updates = {}
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove fingerprint index {self.path}: {e}")
+
+    def _load(self) -> Dict[str, List[Any]]:
+        """Load the index file once."""
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                return self._entries
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable fingerprint index {self.path}: {e}")
+                return self._entries
+            if isinstance(data, dict) and data.get('version') == self.VERSION and isinstance(data.get('files'), dict):
+                self._entries = {
+                    path: entry for path, entry in data['files'].items()
+                    if isinstance(entry, list) and len(entry) == 4
+                }
+        return self._entries
+
+    def _write(self, entries: Dict[str, List[Any]]) -> bool:
+        """Write the index file atomically."""
+        data = json.dumps({'version': self.VERSION, 'files': entries}, separators=(',', ':'))
+        try:
+            write_atomic(self.path, data.encode('utf-8'))
+        except OSError as e:
+            logger.warning(f"Failed to write fingerprint index {self.path}: {e}")
+            return False
+        self._entries = entries
+        return True
+
+def _binding_names(stmt: ast.stmt) -> Iterable[str]:
+    """Get the module-level names bound by an import or assignment."""
+    if isinstance(stmt, ast.Import):
+        return [alias.asname or alias.name.split('.')[0] for alias in stmt.names]
+    if isinstance(stmt, ast.ImportFrom):
+        return [alias.asname or alias.name for alias in stmt.names]
+    return get_bound_names(stmt)
+
+def get_definition_keys(
+    tree: ast.AST,
+    definitions: List[ast.AST],
+    source_code: SourceFile,
+    config: Mapping[str, Any]
+) -> Dict[ast.AST, str]:
+    """Get the cache keys of the modules built for definitions.
+
+    The key of a definition hashes its source lines (decorators and
+    indentation included) together with the source of the module-level
+    imports and assignments of every name it uses, so editing one
+    definition or one of its imports/globals only invalidates the modules
+    that depend on it.
+
+    Args:
+        tree: Parsed module AST
+        definitions: Class and function nodes of ``tree``
+        source_code: Source of the parsed file
+        config: Configuration used to build the modules
+
+    Returns:
+        Mapping of definition node to key; definitions without usable
+        source positions are left out
+    """
+    # Hash the binding statements of every module-level name
+    bindings: Dict[str, List[str]] = defaultdict(list)
+    for stmt in iter_module_statements(getattr(tree, 'body', [])):
+        names = list(_binding_names(stmt))
+        if not names:
+            continue
+        segment = source_code.get_lines(stmt) or b''
+        digest = hashlib.sha256(segment).hexdigest()
+        for name in names:
+            bindings[name].append(digest)
+
+    # Names used inside each definition, collected in one walk
+    wanted = set(definitions)
+    used: Dict[ast.AST, Set[str]] = {node: set() for node in definitions}
+    queue = deque([(tree, ())])
+    while queue:
+        node, scopes = queue.popleft()
+        if node in wanted:
+            scopes = scopes + (used[node],)
+        elif isinstance(node, ast.Name) and node.id in bindings:
+            for names in scopes:
+                names.add(node.id)
+        for child in ast.iter_child_nodes(node):
+            queue.append((child, scopes))
+
+    base = AnalysisCache.make_key('', config)
+    keys = {}
+    for node in definitions:
+        lines = source_code.get_lines(node)
+        if lines is None:
+            continue
+        digest = hashlib.sha256(base.encode('ascii'))
+        digest.update(type(node).__name__.encode('ascii'))
+        digest.update(hashlib.sha256(lines).digest())
+        for name in sorted(used[node]):
+            digest.update(f"\0{name}:{','.join(bindings[name])}".encode('utf-8'))
+        keys[node] = digest.hexdigest()
+    return keys
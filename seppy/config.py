@@ -1,40 +1,69 @@
-from typing import List
+from typing import List, Dict, Any
 from typing_extensions import TypedDict
 
 class SeppyConfig(TypedDict):
     """Configuration type definition."""
     IGNORE_PATTERNS: List[str]
+    USE_GITIGNORE: bool
     MEMORY_LIMIT_MB: int
     MAX_THREADS: int
     CACHE_ENABLED: bool
     REPORT_FORMAT: str
     LOG_LEVEL: str
+    PRESERVE_FORMATTING: bool
+    PARALLEL_BUILD: bool
+    ANALYSIS_CONFIG: Dict[str, Any]
+    CACHE_CONFIG: Dict[str, Any]
 
 DEFAULT_CONFIG: SeppyConfig = {
-    "IGNORE_PATTERNS": ["*.pyc", "__pycache__/*", ".*"],
+    "IGNORE_PATTERNS": ["*.pyc", "__pycache__/", ".*", "node_modules/"],
+    "USE_GITIGNORE": False,
     "MEMORY_LIMIT_MB": 1024,
     "MAX_THREADS": 4,
     "CACHE_ENABLED": True,
     "REPORT_FORMAT": "md",
-    "LOG_LEVEL": "INFO"
+    "LOG_LEVEL": "INFO",
+    "PRESERVE_FORMATTING": True,
+    "PARALLEL_BUILD": False,
+    "ANALYSIS_CONFIG": {
+        "CATEGORIES": None  # None analyzes every structure category
+    },
+    "CACHE_CONFIG": {
+        "DIRECTORY": None,       # None uses CACHE_DIR_NAME in the working directory
+        "MAX_SIZE_MB": 1024,     # Same as MAX_CACHE_SIZE
+        "EXPIRATION_DAYS": 30    # Entries unused for longer are evicted
+    }
 }
 
 # Constants for file operations
 MAX_LINES_PER_READ = 250
 CACHE_DIR_NAME = '.seppy_cache'
+CACHE_DIR_ENV = 'SEPPY_CACHE_DIR'  # Environment variable overriding the cache directory
 DEFAULT_ENCODING = 'utf-8'
+MMAP_THRESHOLD = 1024 * 1024  # Read cache entries of 1 MB and more via mmap
+OUTPUT_MANIFEST_NAME = '.seppy_manifest.json'  # Content hashes of written outputs
+OUTPUT_STATE_NAME = '.seppy_state.json'  # Definition keys of the last incremental split
+OUTPUT_INDEX_NAME = '.seppy_index.json'  # Modules and graphs of every file of a batch
 
 # Constants for memory management
 MIN_MEMORY_LIMIT = 256  # MB
 MAX_MEMORY_LIMIT = 8192  # MB
 MEMORY_CHECK_INTERVAL = 60  # seconds
+MEMORY_SAMPLE_INTERVAL = 0.05  # seconds between RSS samples at checkpoints
+MEMORY_MAX_SAMPLES = 1000  # Older RSS samples are dropped beyond this many
+MEMORY_SOFT_LIMIT = 0.8  # Degrade gracefully above 80% of the limit
 
 # Constants for parallel processing
 MIN_THREADS = 1
 MAX_THREADS = 16
 DEFAULT_THREAD_COUNT = 4
 
+# Constants for watch mode
+WATCH_INTERVAL = 0.5  # seconds between polls
+WATCH_DEBOUNCE = 0.2  # seconds without changes before a burst is processed
+
 # Constants for caching
-CACHE_VERSION = '1.0.0'
+CACHE_VERSION = '2.0.0'
 MAX_CACHE_SIZE = 1024 * 1024 * 1024  # 1 GB
-CACHE_CLEANUP_THRESHOLD = 0.9  # 90% 
\ No newline at end of file
+CACHE_CLEANUP_THRESHOLD = 0.9  # 90%
+CACHE_CLEANUP_TARGET = 0.7  # Evict down to 70% of the limit 
\ No newline at end of file
@@ -3,28 +3,37 @@ import os
 import json
 import yaml
 import hashlib
-import pickle
 from pathlib import Path
 from collections import defaultdict
-from typing import Dict, Set, Any, Optional, List, Tuple
+from typing import Dict, Set, Any, Optional, List, Tuple, Iterable
 import concurrent.futures
+import multiprocessing
 import asyncio
 import time
 import gc
 import psutil
 from functools import lru_cache
 
-from .config import DEFAULT_CONFIG, SeppyConfig, CACHE_DIR_NAME
-from .models import ModuleInfo, CacheData, ProcessingStats
-from .exceptions import ParseError, ModuleProcessingError, CacheError
+from .config import DEFAULT_CONFIG, SeppyConfig, MIN_THREADS, MAX_THREADS, OUTPUT_STATE_NAME
+from .models import ModuleInfo, CacheData, ProcessingStats, AnalysisResult
+from .source import SourceFile, read_source
+from .writer import OutputWriter
+from .cache import AnalysisCache, get_definition_keys, write_atomic
+from .memory import MemoryGovernor, get_memory_limit
+from .exceptions import ParseError, ModuleProcessingError, CacheError, MemoryLimitError
 from .utils import time_operation, logger
 from .analyzers import (
     find_used_imports,
     find_used_globals,
     extract_imports,
+    get_import_names,
+    scan_module_level,
     analyze_complex_structures,
-    get_parent_function_or_class,
-    is_node_in_function_or_class
+    get_node_index,
+    drop_definition_bodies,
+    NodeIndex,
+    StructureVisitor,
+    DependencyGraphBuilder
 )
 from .processors import (
     organize_imports,
@@ -38,7 +47,8 @@ class Seppy:
         self,
         source_file: str,
         config_file: Optional[str] = None,
-        memory_limit_mb: Optional[int] = None
+        memory_limit_mb: Optional[int] = None,
+        cache_dir: Optional[str] = None
     ):
         """Initialize Seppy with configuration.
         
@@ -46,6 +56,7 @@ class Seppy:
             source_file: Path to the source Python file
             config_file: Optional path to configuration file
             memory_limit_mb: Optional memory limit override
+            cache_dir: Optional cache directory override
         """
         self.source_file = source_file
         self.config = self._load_config(config_file)
@@ -53,21 +64,35 @@ class Seppy:
         # Override memory limit if provided
         if memory_limit_mb is not None:
             self.config["MEMORY_LIMIT_MB"] = memory_limit_mb
+        self.config["MEMORY_LIMIT_MB"] = get_memory_limit(self.config["MEMORY_LIMIT_MB"])
         
         self.modules: Dict[str, ModuleInfo] = {}
-        self.dependencies_graph: Dict[str, Set[str]] = defaultdict(set)
+        self.graph_builder = DependencyGraphBuilder()
         self.type_annotations: Dict[str, str] = {}
         self.has_async_code = False
-        self.cache_dir = Path(CACHE_DIR_NAME)
+        self._docs_generated = False
+        self._new_docs: Set[str] = set()
+        self._definition_keys: Dict[str, str] = {}
+        # Output directory and incremental state of the last split_incremental
+        self._state: Optional[Tuple[Path, Dict[str, Any]]] = None
+        # Writer of the output being built, and the modules it already got
+        self._writer: Optional[OutputWriter] = None
+        self._flushed: Dict[str, ModuleInfo] = {}
+        self.cache = AnalysisCache.from_config(self.config, cache_dir)
+        self.cache_dir = self.cache.cache_dir
+        self.cache_key: Optional[str] = None
+        self.source_hash: Optional[str] = None
         
         if self.config["CACHE_ENABLED"]:
-            self.cache_dir.mkdir(exist_ok=True)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
         
         self.stats = ProcessingStats()
         self.memory_limit = self.config["MEMORY_LIMIT_MB"] * 1024 * 1024
+        # RSS samples in MB, shared with self.stats.memory_usage
+        self.memory = MemoryGovernor(self.config["MEMORY_LIMIT_MB"], self.stats.memory_usage)
         self.performance_stats = {
             'start_time': time.time(),
-            'memory_usage': [],
+            'memory_usage': self.memory.samples,
             'processing_times': defaultdict(list)
         }
     
@@ -77,77 +102,109 @@ class Seppy:
 
     def _load_config(self, config_file: Optional[str]) -> SeppyConfig:
         """Load configuration from file or use defaults."""
-        config = DEFAULT_CONFIG.copy()
-        
-        if config_file:
-            try:
-                with open(config_file) as f:
-                    if config_file.endswith('.json'):
-                        user_config = json.load(f)
-                    elif config_file.endswith('.yaml') or config_file.endswith('.yml'):
-                        user_config = yaml.safe_load(f)
-                    else:
-                        raise ValueError("Config file must be .json or .yaml")
-                    
-                config.update(user_config)
-                logger.info(f"Loaded configuration from {config_file}")
-            except Exception as e:
-                logger.warning(f"Failed to load config file: {e}. Using defaults.")
-        
-        return config
+        return load_config(config_file)
 
     @time_operation("parse_script")
-    def parse_script(self, source_file: str) -> Dict[str, ModuleInfo]:
-        """Parse Python script and extract module information."""
+    def parse_script(self, source_file: str, source_hash: Optional[str] = None) -> Dict[str, ModuleInfo]:
+        """Parse Python script and extract module information.
+        
+        With caching enabled, a file whose stat data matches the fingerprint
+        index is looked up in the cache without being read.
+        
+        Args:
+            source_file: Path to the source Python file
+            source_hash: Optional content hash of the file, already looked
+                up by the caller; the fingerprint index is then left to it,
+                as it is when ``self.cache.deferred`` is set
+        """
         try:
-            with open(source_file, 'r', encoding='utf-8') as f:
-                content = f.read()
+            self.cache_key = None
+            self.source_hash = None
+            # Cache hits and misses both start from an empty graph
+            self.graph_builder = DependencyGraphBuilder()
+            if self.config["CACHE_ENABLED"]:
+                fingerprints = self.cache.fingerprints
+                stat = fingerprints.stat(source_file)
+                known_hash = source_hash or fingerprints.lookup(source_file, stat)
+                if known_hash is not None:
+                    self.cache_key = self.cache.make_key(known_hash, self.config)
+                    cached = self.cache.load(self.cache_key)
+                    if cached is not None:
+                        self.source_hash = known_hash
+                        return self._restore_cached(cached)
+            
+            source = read_source(source_file)
+            self.memory.check("reading the source", force=True)
+            if self.config["CACHE_ENABLED"]:
+                # Key the result by what was actually read
+                self.source_hash = source.hash
+                self.cache_key = self.cache.make_key(self.source_hash, self.config)
+                if source_hash is None and not self.cache.deferred:
+                    fingerprints.record(source_file, stat, self.source_hash)
+                    fingerprints.save()
             
-            tree = ast.parse(content)
+            tree = ast.parse(source.text, filename=source_file)
+            self.memory.check("parsing", force=True)
+            node_index = get_node_index(tree)
             self._analyze_dependencies(tree)
             
             # Extract global variables and imports
-            global_vars = set()
-            imports = extract_imports(tree)
-            
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
-                    if not is_node_in_function_or_class(node, tree):
-                        global_vars.add(node.id)
+            global_vars, imports = scan_module_level(tree)
             
             # Split into modules
-            functions = [n for n in ast.walk(tree) if isinstance(n, ast.FunctionDef)]
-            async_functions = [n for n in ast.walk(tree) if isinstance(n, ast.AsyncFunctionDef)]
-            classes = [n for n in ast.walk(tree) if isinstance(n, ast.ClassDef)]
+            functions = node_index.nodes(ast.FunctionDef)
+            async_functions = node_index.nodes(ast.AsyncFunctionDef)
+            classes = node_index.nodes(ast.ClassDef)
             
             if async_functions:
                 self.has_async_code = True
             
             # Store modules in instance variable
-            self.modules = self._split_into_modules(tree, global_vars, functions, async_functions, classes)
+            self.modules = self._split_into_modules(tree, global_vars, functions, async_functions, classes, source)
             
             self.stats.total_modules = len(self.modules)
+            self._store_cached()
+            self.memory.check("analyzing", force=True)
             return self.modules
             
+        except MemoryLimitError:
+            raise
         except Exception as e:
             raise ParseError(f"Failed to parse script: {str(e)}")
 
+    def _restore_cached(self, cached: AnalysisResult) -> Dict[str, ModuleInfo]:
+        """Use a cached analysis result instead of parsing the script."""
+        self.modules = cached.modules
+        self.dependencies_graph = defaultdict(set, {k: set(v) for k, v in cached.dependencies.items()})
+        self.has_async_code = self.has_async_code or cached.has_async_code
+        
+        self.stats.total_modules = len(self.modules)
+        self.stats.cached_modules += len(self.modules)
+        logger.info(f"Loaded {len(self.modules)} modules of {self.source_file} from cache")
+        return self.modules
+
+    def _store_cached(self) -> None:
+        """Store the current analysis result in the cache."""
+        if self.cache_key is None:
+            return
+        self.cache.store(self.cache_key, AnalysisResult(
+            modules=self.modules,
+            dependencies={k: list(v) for k, v in self.dependencies_graph.items()},
+            has_async_code=self.has_async_code
+        ))
+
+    @property
+    def dependencies_graph(self) -> Dict[str, Set[str]]:
+        """Dependency graph between definitions, built on first access."""
+        return self.graph_builder.graph
+
+    @dependencies_graph.setter
+    def dependencies_graph(self, graph: Dict[str, Set[str]]) -> None:
+        self.graph_builder.graph = graph
+
     def _analyze_dependencies(self, tree: ast.AST) -> None:
         """Analyze dependencies between different parts of the code."""
-        for node in ast.walk(tree):
-            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
-                parent = get_parent_function_or_class(node, tree)
-                if parent:
-                    self.dependencies_graph[parent].add(node.name)
-                
-                # Analyze function calls and attribute access
-                for child in ast.walk(node):
-                    if isinstance(child, ast.Call):
-                        if isinstance(child.func, ast.Name):
-                            self.dependencies_graph[node.name].add(child.func.id)
-                        elif isinstance(child.func, ast.Attribute):
-                            if isinstance(child.func.value, ast.Name):
-                                self.dependencies_graph[node.name].add(child.func.value.id)
+        self.graph_builder.add_tree(tree)
 
     def _split_into_modules(
         self,
@@ -155,95 +212,399 @@ class Seppy:
         global_vars: Dict[str, Any],
         functions: List[ast.FunctionDef],
         async_functions: List[ast.AsyncFunctionDef],
-        classes: List[ast.ClassDef]
+        classes: List[ast.ClassDef],
+        source_code: Optional[SourceFile] = None
     ) -> Dict[str, ModuleInfo]:
         """Split code into separate modules."""
         modules = {}
         
-        # Get source code
-        try:
-            with open(self.source_file, 'r', encoding='utf-8') as f:
-                source_code = f.read()
-        except Exception as e:
-            logger.warning(f"Could not read source file for code preservation: {e}")
-            source_code = ""
-        
-        # Create module for each class
-        for class_node in classes:
-            class_name = class_node.name.lower()
-            if not any(class_name.startswith(prefix) for prefix in self.config["IGNORE_PATTERNS"]):
-                structures = analyze_complex_structures(class_node, source_code)
-                code = create_complex_module(class_name, class_node, structures)
-                
-                modules[class_name] = ModuleInfo(
-                    name=class_name,
-                    code=code,
-                    imports=structures['imports'],
-                    global_vars=structures['globals'],
-                    functions=set(structures['functions'].keys()),
-                    classes=set(structures['classes'].keys()),
-                    docstring=ast.get_docstring(class_node)
-                )
+        # Get source code, unless the parsed buffer was passed in
+        if source_code is None:
+            try:
+                source_code = read_source(self.source_file)
+            except Exception as e:
+                logger.warning(f"Could not read source file for code preservation: {e}")
+                source_code = SourceFile("", self.source_file)
         
-        # Create module for each function
-        for func_node in functions + async_functions:
-            func_name = func_node.name.lower()
-            if not any(func_name.startswith(prefix) for prefix in self.config["IGNORE_PATTERNS"]):
-                structures = analyze_complex_structures(func_node, source_code)
-                code = create_complex_module(func_name, func_node, structures)
-                
-                modules[func_name] = ModuleInfo(
-                    name=func_name,
-                    code=code,
-                    imports=structures['imports'],
-                    global_vars=structures['globals'],
-                    functions={func_node.name},
-                    classes=set(),
-                    async_functions={func_node.name} if isinstance(func_node, ast.AsyncFunctionDef) else set(),
-                    docstring=ast.get_docstring(func_node)
-                )
+        # Collect definitions in output order: classes first, then functions
+        definitions = self._select_definitions(classes + functions + async_functions)
+        return self._build_modules(tree, definitions, source_code)
+
+    def _select_definitions(self, nodes: List[ast.AST]) -> List[ast.AST]:
+        """Drop definitions whose names match IGNORE_PATTERNS."""
+        return [
+            node for node in nodes
+            if not any(node.name.lower().startswith(prefix) for prefix in self.config["IGNORE_PATTERNS"])
+        ]
+
+    def _build_modules(
+        self,
+        tree: ast.AST,
+        definitions: List[ast.AST],
+        source_code: SourceFile,
+        keys: Optional[Dict[ast.AST, str]] = None
+    ) -> Dict[str, ModuleInfo]:
+        """Build the modules of definitions, reusing cached ones.
+        
+        Args:
+            tree: Parsed module AST
+            definitions: Class and function nodes of ``tree``, in output order
+            source_code: Source of the parsed file
+            keys: Optional definition keys, already computed by the caller
+        
+        Returns:
+            Modules by name
+        """
+        modules = {}
+        
+        # Reuse the modules of definitions that did not change
+        cached: Dict[ast.AST, ModuleInfo] = {}
+        if not self.config["CACHE_ENABLED"]:
+            keys = {}
+        elif keys is None:
+            keys = get_definition_keys(tree, definitions, source_code, self.config)
+        if keys:
+            for node, key in keys.items():
+                module = self.cache.load_definition(key)
+                if module is not None:
+                    cached[node] = module
+        missing = [node for node in definitions if node not in cached]
+        
+        workers = self._get_build_workers(len(missing))
+        if workers > 1:
+            results = self._build_modules_parallel(missing, source_code, workers)
+            built = {node: module for node, (_, module) in zip(missing, results)}
+        elif missing:
+            # Analyze the whole tree once; each definition's structures are memoized
+            analysis = StructureVisitor(
+                source_code,
+                self.config["PRESERVE_FORMATTING"],
+                self._get_analysis_categories()
+            )
+            analysis.visit(tree)
+            built = {}
+            
+            def release() -> None:
+                # Under memory pressure, drop the analysis and the subtrees of
+                # definitions already built and write their modules out
+                pending = [node for node in missing if node not in built]
+                analysis.release(keep=pending)
+                drop_definition_bodies(tree, pending)
+                self._flush_modules(built.values())
+            
+            with self.memory.relief(release):
+                for node in missing:
+                    built[node] = build_definition_module(node, source_code, analysis)[1]
+                    self.memory.check("building modules")
+        else:
+            built = {}
+        
+        self._definition_keys = {}
+        for node in definitions:
+            module = cached.get(node) or built[node]
+            modules[module.name] = module
+            if node in keys:
+                self._definition_keys[module.name] = keys[node]
+                if node in built:
+                    self.cache.store_definition(keys[node], module)
+            else:
+                self._definition_keys.pop(module.name, None)
+        
+        reused = {id(module) for module in cached.values()}
+        self.stats.cached_modules += sum(1 for module in modules.values() if id(module) in reused)
         
         return modules
 
-    def save_modules(self, output_dir: str):
-        """Save split modules to files."""
-        output_path = Path(output_dir)
-        output_path.mkdir(parents=True, exist_ok=True)
+    def _get_analysis_categories(self) -> Optional[List[str]]:
+        """Get the structure categories enabled in the configuration."""
+        return (self.config.get("ANALYSIS_CONFIG") or {}).get("CATEGORIES")
+
+    def _get_build_workers(self, definitions: int) -> int:
+        """Get the number of worker processes for building modules (1 = serial)."""
+        if not self.config.get("PARALLEL_BUILD") or definitions < 2:
+            return 1
+        if self.memory.degraded:
+            logger.info("Building modules serially to save memory")
+            return 1
+        # Forked workers share the hash seed of this process, which keeps the
+        # iteration order of sets, and so the output, identical to a serial build
+        if "fork" not in multiprocessing.get_all_start_methods():
+            logger.warning("Parallel build needs the fork start method; building modules serially")
+            return 1
+        threads = self.config.get("MAX_THREADS") or MIN_THREADS
+        return max(MIN_THREADS, min(threads, MAX_THREADS, os.cpu_count() or 1, definitions))
+
+    def _build_modules_parallel(
+        self,
+        definitions: List[ast.AST],
+        source_code: SourceFile,
+        workers: int
+    ) -> List[Tuple[str, ModuleInfo]]:
+        """Build definition modules in a process pool.
         
-        # Save each module
-        for name, module in self.modules.items():
-            module_path = output_path / f"{name}.py"
-            try:
-                with open(module_path, 'w', encoding='utf-8') as f:
-                    f.write(module.code)
-                logger.info(f"Saved module {name} to {module_path}")
-            except Exception as e:
-                logger.error(f"Failed to save module {name}: {str(e)}")
+        Workers receive the source text once and each definition as its
+        location; results are returned in the order of ``definitions``.
+        """
+        locations = [get_node_location(node) for node in definitions]
+        chunksize = max(1, len(locations) // (workers * 4))
+        logger.debug(f"Building {len(locations)} modules in {workers} processes")
         
-        # Generate and save documentation
-        docs_path = output_path / "docs"
-        docs_path.mkdir(exist_ok=True)
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_build_worker,
+            initargs=(
+                source_code.text,
+                self.source_file,
+                self.config["PRESERVE_FORMATTING"],
+                self._get_analysis_categories()
+            )
+        ) as executor:
+            return list(executor.map(_build_module_in_worker, locations, chunksize=chunksize))
+
+    def split(self, output_dir: str, source_hash: Optional[str] = None) -> Dict[str, ModuleInfo]:
+        """Parse the source file and save its modules.
+        
+        The output is the same as that of parse_script followed by
+        save_modules, but modules finished while memory is short are
+        written out during the build.
+        
+        Args:
+            output_dir: Directory to save the modules to
+            source_hash: Optional content hash of the file, see parse_script
         
-        for name, module in self.modules.items():
-            doc_path = docs_path / f"{name}.md"
+        Returns:
+            Modules by name
+        """
+        output_path = Path(output_dir)
+        with OutputWriter(output_path, self._get_writer_threads(), self.stats) as writer:
+            self._writer, self._flushed = writer, {}
             try:
-                docs = create_module_docs(name, module.code)
-                with open(doc_path, 'w', encoding='utf-8') as f:
-                    f.write(docs)
-                logger.info(f"Saved documentation for {name} to {doc_path}")
-            except Exception as e:
-                logger.error(f"Failed to save documentation for {name}: {str(e)}")
+                self.parse_script(self.source_file, source_hash)
+            finally:
+                self._writer = None
+            self._submit_outputs(writer, self.modules)
+        self._finish_outputs(output_path)
+        return self.modules
+
+    def save_modules(self, output_dir: str):
+        """Save split modules to files.
+        
+        Modules, their documentation and the dependency graph are written
+        by an OutputWriter thread pool of MAX_THREADS threads. Files that
+        fail to save are reported in ``self.stats.errors``.
+        """
+        output_path = Path(output_dir)
+        with OutputWriter(output_path, self._get_writer_threads(), self.stats) as writer:
+            self._submit_outputs(writer, self.modules)
+        self._finish_outputs(output_path)
+
+    def _get_writer_threads(self) -> int:
+        """Get the number of writer threads, one when memory is short."""
+        return MIN_THREADS if self.memory.degraded else self.config["MAX_THREADS"]
+
+    def _flush_modules(self, modules: Iterable[ModuleInfo]) -> None:
+        """Write built modules to the output being built, if any, and wait for them."""
+        if self._writer is None:
+            return
+        # Of two definitions with the same name, the later one is written
+        latest = {module.name: module for module in modules}
+        for name, module in latest.items():
+            if self._flushed.get(name) is not module:
+                self._writer.submit(f"{name}.py", lambda module=module: module.code, f"module {name}")
+                self._flushed[name] = module
+        self._writer.wait()
+
+    def _submit_outputs(self, writer: OutputWriter, modules: Dict[str, ModuleInfo]) -> None:
+        """Queue modules, their documentation and the dependency graph."""
+        flushed, self._flushed = self._flushed, {}
+        # Convert sets to sorted lists, so the file does not depend on set order
+        serializable_graph = {k: sorted(v) for k, v in self.dependencies_graph.items()}
+        
+        # Save each module and its documentation; when memory runs short,
+        # queued files are written out before more are produced
+        for name, module in modules.items():
+            if flushed.get(name) is module:
+                continue
+            writer.submit(f"{name}.py", lambda module=module: module.code, f"module {name}")
+            if self.memory.check("writing modules"):
+                writer.wait()
+        for name, module in modules.items():
+            writer.submit(
+                Path("docs") / f"{name}.md",
+                lambda name=name, module=module: self._get_module_docs(name, module),
+                f"documentation for {name}"
+            )
+            if self.memory.check("writing documentation"):
+                writer.wait()
         
         # Save dependency graph
+        writer.submit(
+            "dependencies.json",
+            lambda: json.dumps(serializable_graph, indent=2),
+            "dependency graph"
+        )
+
+    def _finish_outputs(self, output_path: Path) -> None:
+        """Complete a save: create the docs directory and cache generated docs."""
+        # Documentation directory exists even without modules
+        (output_path / "docs").mkdir(exist_ok=True)
+        self.memory.check("saving", force=True)
+        
+        # Keep the generated documentation with the cached results
+        if self._docs_generated:
+            self._store_cached()
+            for name, module in self.modules.items():
+                key = self._definition_keys.get(name)
+                if key is not None and name in self._new_docs:
+                    self.cache.store_definition(key, module)
+            self._docs_generated = False
+            self._new_docs = set()
+        if self.config["CACHE_ENABLED"]:
+            self.cache.maintain()
+
+    @time_operation("split_incremental")
+    def split_incremental(self, output_dir: str) -> Dict[str, List[str]]:
+        """Re-split the source file, regenerating only definitions that changed.
+        
+        Args:
+            output_dir: Output directory of the previous and this run
+        
+        Returns:
+            Names of the 'added', 'changed' and 'removed' modules
+        """
+        # The definition keys (see get_definition_keys) and the edges of every
+        # top-level definition are kept in OUTPUT_STATE_NAME, and in memory for
+        # further calls on this instance. Without a usable state every
+        # definition counts as added; self.modules only holds rebuilt modules.
+        output_path = Path(output_dir)
         try:
-            # Convert sets to lists for JSON serialization
-            serializable_graph = {k: list(v) for k, v in self.dependencies_graph.items()}
-            graph_path = output_path / "dependencies.json"
-            with open(graph_path, 'w', encoding='utf-8') as f:
-                json.dump(serializable_graph, f, indent=2)
-            logger.info(f"Saved dependency graph to {graph_path}")
+            source = read_source(self.source_file)
+            tree = ast.parse(source.text, filename=self.source_file)
         except Exception as e:
-            logger.error(f"Failed to save dependency graph: {str(e)}")
+            raise ParseError(f"Failed to parse script: {str(e)}")
+        self.memory.check("parsing", force=True)
+        
+        node_index = get_node_index(tree)
+        async_functions = node_index.nodes(ast.AsyncFunctionDef)
+        if async_functions:
+            self.has_async_code = True
+        definitions = self._select_definitions(
+            node_index.nodes(ast.ClassDef) + node_index.nodes(ast.FunctionDef) + async_functions
+        )
+        keys = get_definition_keys(tree, definitions, source, self.config)
+        
+        # The module of a name comes from its last definition
+        current: Dict[str, ast.AST] = {}
+        for node in definitions:
+            current[node.name.lower()] = node
+        
+        state = self._load_state(output_path)
+        previous: Dict[str, str] = state.get('modules', {})
+        stored_edges: Dict[str, List[Any]] = state.get('edges', {})
+        
+        # self.modules is partial, it must not become the file's cache entry
+        self.cache_key = None
+        self.graph_builder = DependencyGraphBuilder()
+        
+        # Edges of unchanged top-level definitions come from the state; new
+        # ones are collected before the build, which may drop subtrees
+        edges: Dict[str, List[Any]] = {}
+        siblings = []
+        for stmt in tree.body:
+            key = keys.get(stmt)
+            if key is not None and key in stored_edges:
+                levels = stored_edges[key]
+            else:
+                levels = self.graph_builder.collect_edges(stmt)
+            if key is not None:
+                edges[key] = levels
+            siblings.append(levels)
+        self.graph_builder.add_levels(siblings)
+        
+        with OutputWriter(output_path, self._get_writer_threads(), self.stats) as writer:
+            stale = [
+                node for name, node in current.items()
+                if node not in keys
+                or previous.get(name) != keys[node]
+                or not writer.keep(f"{name}.py", Path("docs") / f"{name}.md")
+            ]
+            self._writer, self._flushed = writer, {}
+            try:
+                self.modules = self._build_modules(
+                    tree,
+                    stale,
+                    source,
+                    {node: keys[node] for node in stale if node in keys}
+                )
+            finally:
+                self._writer = None
+            
+            self._submit_outputs(writer, self.modules)
+        self._finish_outputs(output_path)
+        
+        # Outputs that failed to save are regenerated next time
+        failed = writer.failed
+        self._save_state(output_path, {
+            name: keys[node] for name, node in current.items()
+            if node in keys and f"{name}.py" not in failed and f"docs/{name}.md" not in failed
+        }, edges)
+        
+        stale_names = [node.name.lower() for node in stale]
+        changes = {
+            'added': [name for name in stale_names if name not in previous],
+            'changed': [name for name in stale_names if name in previous],
+            'removed': sorted(set(previous) - set(current))
+        }
+        self.stats.total_modules = len(current)
+        logger.info(
+            f"Incremental split of {self.source_file}: {len(changes['added'])} added, "
+            f"{len(changes['changed'])} changed, {len(changes['removed'])} removed, "
+            f"{len(current) - len(stale)} unchanged"
+        )
+        return changes
+
+    def _load_state(self, output_path: Path) -> Dict[str, Any]:
+        """Load the incremental state of an output directory, if it belongs to this source."""
+        if self._state is not None and self._state[0] == output_path.resolve():
+            return self._state[1]
+        path = output_path / OUTPUT_STATE_NAME
+        try:
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable incremental state {path}: {e}")
+            return {}
+        if (
+            not isinstance(state, dict)
+            or state.get('source') != os.path.abspath(self.source_file)
+            or not isinstance(state.get('modules'), dict)
+            or not isinstance(state.get('edges'), dict)
+        ):
+            return {}
+        return state
+
+    def _save_state(self, output_path: Path, modules: Dict[str, str], edges: Dict[str, List[Any]]) -> None:
+        """Save the definition keys and edges of an incremental split."""
+        path = output_path / OUTPUT_STATE_NAME
+        state = {'source': os.path.abspath(self.source_file), 'modules': modules, 'edges': edges}
+        self._state = (output_path.resolve(), state)
+        try:
+            write_atomic(path, json.dumps(state, separators=(',', ':')).encode('utf-8'))
+        except OSError as e:
+            error = f"Failed to save incremental state {path}: {str(e)}"
+            logger.error(error)
+            self.stats.errors.append(error)
+
+    def _get_module_docs(self, name: str, module: ModuleInfo) -> str:
+        """Get the documentation of a module, generating it once."""
+        if not module.docs:
+            module.docs = create_module_docs(name, module.code)
+            self._docs_generated = True
+            self._new_docs.add(name)
+        return module.docs
 
     def _generate_performance_report(self) -> str:
         """Generate a performance report."""
@@ -257,77 +618,156 @@ class Seppy:
             f"Cached modules: {self.stats.cached_modules}",
             f"Failed modules: {self.stats.failed_modules}",
             "\nMemory Usage:",
-            f"Peak: {max(self.performance_stats['memory_usage'])} MB",
+            f"Peak: {self.memory.peak} MB",
             f"Average: {sum(self.performance_stats['memory_usage']) / len(self.performance_stats['memory_usage']):.2f} MB"
         ]
         
         return "\n".join(report)
 
+def load_config(config_file: Optional[str] = None) -> SeppyConfig:
+    """Load configuration from file or use defaults."""
+    config = DEFAULT_CONFIG.copy()
+    
+    if config_file:
+        try:
+            with open(config_file) as f:
+                if config_file.endswith('.json'):
+                    user_config = json.load(f)
+                elif config_file.endswith('.yaml') or config_file.endswith('.yml'):
+                    user_config = yaml.safe_load(f)
+                else:
+                    raise ValueError("Config file must be .json or .yaml")
+                
+            config.update(user_config)
+            logger.info(f"Loaded configuration from {config_file}")
+        except Exception as e:
+            logger.warning(f"Failed to load config file: {e}. Using defaults.")
+    
+    return config
+
+def build_definition_module(
+    node: ast.AST,
+    source_code: SourceFile,
+    analysis: StructureVisitor
+) -> Tuple[str, ModuleInfo]:
+    """Build the module of a class or function definition.
+    
+    Args:
+        node: Class, function or async function node
+        source_code: Source of the parsed file
+        analysis: Visitor that has visited the tree containing ``node``
+        
+    Returns:
+        Tuple of (module name, module info)
+    """
+    name = node.name.lower()
+    structures = analyze_complex_structures(node, source_code, cache=analysis)
+    code = create_complex_module(name, node, structures)
+    
+    if isinstance(node, ast.ClassDef):
+        module = ModuleInfo(
+            name=name,
+            code=code,
+            imports=structures['imports'],
+            global_vars=structures['globals'],
+            functions=set(structures['functions'].keys()),
+            classes=set(structures['classes'].keys()),
+            docstring=ast.get_docstring(node)
+        )
+    else:
+        module = ModuleInfo(
+            name=name,
+            code=code,
+            imports=structures['imports'],
+            global_vars=structures['globals'],
+            functions={node.name},
+            classes=set(),
+            async_functions={node.name} if isinstance(node, ast.AsyncFunctionDef) else set(),
+            docstring=ast.get_docstring(node)
+        )
+    return name, module
+
+def get_node_location(node: ast.AST) -> Tuple[int, int, int, int]:
+    """Get the source location of a node."""
+    return (node.lineno, node.col_offset, node.end_lineno, node.end_col_offset)
+
+# State of a module build worker process, set up by _init_build_worker
+_worker_state: Dict[str, Any] = {}
+
+def _init_build_worker(
+    text: str,
+    source_file: str,
+    preserve_formatting: bool,
+    categories: Optional[List[str]]
+) -> None:
+    """Parse and analyze the source once per worker process."""
+    source_code = SourceFile(text, source_file)
+    tree = ast.parse(text, filename=source_file)
+    analysis = StructureVisitor(source_code, preserve_formatting, categories)
+    analysis.visit(tree)
+    
+    definitions = get_node_index(tree).nodes(ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+    _worker_state.update(
+        source_code=source_code,
+        analysis=analysis,
+        definitions={get_node_location(node): node for node in definitions}
+    )
+
+def _build_module_in_worker(location: Tuple[int, int, int, int]) -> Tuple[str, ModuleInfo]:
+    """Build the module of the definition at a source location."""
+    node = _worker_state['definitions'][location]
+    return build_definition_module(node, _worker_state['source_code'], _worker_state['analysis'])
+
 class ASTParser:
     """Parser for Python AST analysis."""
     
     def __init__(self, source_code: str):
         self.source_code = source_code
         self.tree = None
+        self._analysis: Optional[Dict[str, Any]] = None
         
     def parse(self) -> ast.AST:
         """Parse source code into AST."""
         try:
             self.tree = ast.parse(self.source_code)
+            self._analysis = None
             return self.tree
         except SyntaxError as e:
             raise ParseError(f"Failed to parse code: {str(e)}")
             
     def analyze(self) -> Dict[str, Any]:
-        """Analyze AST and extract information."""
+        """Analyze AST and extract information.
+        
+        The result is computed from the tree's node-type index and memoized
+        until the code is parsed again.
+        """
         if not self.tree:
             self.parse()
-            
-        return {
-            'imports': self._find_imports(),
-            'classes': self._find_classes(),
-            'functions': self._find_functions(),
-            'globals': self._find_globals()
-        }
+        if self._analysis is None:
+            index = get_node_index(self.tree)
+            self._analysis = {
+                'imports': self._find_imports(index),
+                'classes': self._find_classes(index),
+                'functions': self._find_functions(index),
+                'globals': self._find_globals(index)
+            }
+        return self._analysis
         
-    def _find_imports(self) -> Set[str]:
+    def _find_imports(self, index: NodeIndex) -> Set[str]:
         """Find all imports in the AST."""
-        imports = set()
-        for node in ast.walk(self.tree):
-            if isinstance(node, ast.Import):
-                for name in node.names:
-                    imports.add(name.name)
-            elif isinstance(node, ast.ImportFrom):
-                module = node.module or ''
-                for name in node.names:
-                    if name.name == '*':
-                        imports.add(f"{module}.*")
-                    else:
-                        imports.add(f"{module}.{name.name}")
-        return imports
-        
-    def _find_classes(self) -> Set[str]:
+        return get_import_names(index.nodes(ast.Import, ast.ImportFrom))
+        
+    def _find_classes(self, index: NodeIndex) -> Set[str]:
         """Find all class definitions."""
-        classes = set()
-        for node in ast.walk(self.tree):
-            if isinstance(node, ast.ClassDef):
-                classes.add(node.name)
-        return classes
+        return {node.name for node in index.nodes(ast.ClassDef)}
         
-    def _find_functions(self) -> Set[str]:
+    def _find_functions(self, index: NodeIndex) -> Set[str]:
         """Find all function definitions."""
-        functions = set()
-        for node in ast.walk(self.tree):
-            if isinstance(node, ast.FunctionDef):
-                functions.add(node.name)
-            elif isinstance(node, ast.AsyncFunctionDef):
-                functions.add(node.name)
-        return functions
-        
-    def _find_globals(self) -> Set[str]:
+        return {node.name for node in index.nodes(ast.FunctionDef, ast.AsyncFunctionDef)}
+        
+    def _find_globals(self, index: NodeIndex) -> Set[str]:
         """Find all global variables."""
         globals_vars = set()
-        for node in ast.walk(self.tree):
-            if isinstance(node, ast.Global):
-                globals_vars.update(node.names)
-        return globals_vars 
\ No newline at end of file
+        for node in index.nodes(ast.Global):
+            globals_vars.update(node.names)
+        return globals_vars
\ No newline at end of file
@@ -12,4 +12,12 @@ class ModuleProcessingError(ScriptSplitterError):
 
 class CacheError(ScriptSplitterError):
     """Error during cache operations."""
-    pass 
\ No newline at end of file
+    pass
+
+class GitError(ScriptSplitterError):
+    """Error while querying git."""
+    pass
+
+class MemoryLimitError(ScriptSplitterError):
+    """Memory usage exceeded MEMORY_LIMIT_MB."""
+    pass
\ No newline at end of file
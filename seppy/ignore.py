@@ -0,0 +1,224 @@
+import os
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Pattern, Sequence, Tuple, Union
+
+GITIGNORE_FILE = '.gitignore'
+
+def translate_pattern(pattern: str) -> str:
+    """Translate a slash-separated glob into a regular expression.
+
+    ``*`` and ``?`` do not match ``/``, ``[...]`` is a character class
+    (``[!...]`` negated) and ``**`` matches any number of directories.
+    """
+    segments = pattern.split('/')
+    parts = []
+    for i, segment in enumerate(segments):
+        last = i == len(segments) - 1
+        if segment == '**':
+            parts.append('.*' if last else '(?:.*/)?')
+            continue
+        parts.append(_translate_segment(segment))
+        if not last:
+            parts.append('/')
+    return ''.join(parts)
+
+def _translate_segment(segment: str) -> str:
+    """Translate one path segment of a glob."""
+    result = []
+    i, n = 0, len(segment)
+    while i < n:
+        char = segment[i]
+        i += 1
+        if char == '*':
+            while i < n and segment[i] == '*':
+                i += 1
+            result.append('[^/]*')
+        elif char == '?':
+            result.append('[^/]')
+        elif char == '\\' and i < n:
+            result.append(re.escape(segment[i]))
+            i += 1
+        elif char == '[':
+            end = segment.find(']', i + 1 if i < n and segment[i] in '!^' else i)
+            if end == -1:
+                result.append('\\[')
+                continue
+            body = segment[i:end]
+            i = end + 1
+            negate = body[:1] in ('!', '^')
+            if negate:
+                body = body[1:]
+            body = body.replace('\\', '\\\\').replace('/', '')
+            result.append(f"[{'^/' if negate else ''}{body}]")
+        else:
+            result.append(re.escape(char))
+    return ''.join(result)
+
+class IgnoreMatcher:
+    """Compiled set of gitignore-style patterns.
+
+    All patterns are compiled into one regular expression per entry kind;
+    as in git, the last matching pattern decides and ``!`` re-includes.
+    A pattern containing a slash (other than a trailing one) is relative
+    to the matcher's base directory, otherwise it matches at any depth. A
+    trailing slash matches directories only.
+    """
+
+    def __init__(self, patterns: Sequence[str], base: str = ''):
+        """Initialize matcher.
+
+        Args:
+            patterns: Patterns in gitignore syntax; blank lines and
+                ``#`` comments are skipped
+            base: Directory the patterns are relative to, as a path
+                relative to the scan root ('' for the root itself)
+        """
+        self.base = base.strip('/')
+        self.patterns: List[Tuple[str, bool, bool]] = []
+        for line in patterns:
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            line = line.rstrip(' ') if not line.endswith('\\ ') else line
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            elif line.startswith('\\'):
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            self.patterns.append((line, negate, dir_only))
+
+        self.has_negations = any(negate for _, negate, _ in self.patterns)
+        self._dirs = self._compile(include_dir_only=True)
+        self._files = self._compile(include_dir_only=False)
+
+    def _compile(self, include_dir_only: bool) -> Optional[Pattern[str]]:
+        """Compile the patterns into one regex; later patterns come first."""
+        alternatives = []
+        for i in reversed(range(len(self.patterns))):
+            pattern, negate, dir_only = self.patterns[i]
+            if dir_only and not include_dir_only:
+                continue
+            anchored = '/' in pattern
+            regex = translate_pattern(pattern.lstrip('/'))
+            if not anchored:
+                regex = '(?:.*/)?' + regex
+            # "dir/*" and "dir/**" ignore everything in dir, so the directory
+            # can be pruned without listing it unless a pattern re-includes
+            if include_dir_only and not self.has_negations and (pattern.endswith('/*') or pattern.endswith('/**')):
+                regex = f"(?:{regex}|{translate_pattern(pattern.lstrip('/').rsplit('/', 1)[0])})"
+            alternatives.append(f"(?P<{'n' if negate else 'p'}{i}>{regex})")
+        if not alternatives:
+            return None
+        return re.compile('|'.join(alternatives))
+
+    def match(self, path: str, is_dir: bool = False) -> Optional[bool]:
+        """Check a path relative to the scan root.
+
+        Returns:
+            True if the path is ignored, False if it is re-included by a
+            negated pattern, None if no pattern matches
+        """
+        if self.base:
+            if not path.startswith(self.base + '/'):
+                return None
+            path = path[len(self.base) + 1:]
+        regex = self._dirs if is_dir else self._files
+        if regex is None:
+            return None
+        match = regex.fullmatch(path)
+        if match is None:
+            return None
+        return match.lastgroup[0] == 'p'
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+def is_ignored(matchers: Sequence[IgnoreMatcher], path: str, is_dir: bool = False) -> bool:
+    """Check a path against matchers ordered from lowest to highest priority."""
+    for matcher in reversed(matchers):
+        result = matcher.match(path, is_dir)
+        if result is not None:
+            return result
+    return False
+
+def read_gitignore(directory: str, base: str = '') -> Optional[IgnoreMatcher]:
+    """Load the .gitignore file of a directory, if there is one."""
+    try:
+        with open(os.path.join(directory, GITIGNORE_FILE), encoding='utf-8', errors='replace') as f:
+            matcher = IgnoreMatcher(f.read().splitlines(), base)
+    except OSError:
+        return None
+    return matcher or None
+
+def scan_tree(
+    root: str,
+    ignore_patterns: Sequence[str] = (),
+    use_gitignore: bool = False,
+    suffix: str = '.py',
+    max_depth: Optional[int] = None,
+    exclude: Iterable[Union[str, Path]] = ()
+) -> Iterator[Tuple[Path, str]]:
+    """Find files under a directory, skipping ignored directories unopened.
+
+    Args:
+        root: Directory to scan
+        ignore_patterns: Patterns in gitignore syntax, relative to ``root``
+        use_gitignore: Also honor .gitignore files found during the scan;
+            they take precedence over ``ignore_patterns``
+        suffix: Only yield files with this suffix
+        max_depth: Optional maximum directory depth (0 = only ``root``)
+        exclude: Directories to skip wherever they appear in the tree, such
+            as the output and cache directories
+
+    Yields:
+        Tuples of (file path, path relative to ``root`` with ``/`` separators)
+    """
+    base_matcher = IgnoreMatcher(ignore_patterns)
+    matchers = [base_matcher] if base_matcher else []
+    if use_gitignore:
+        gitignore = read_gitignore(root)
+        if gitignore is not None:
+            matchers.append(gitignore)
+
+    excluded = {os.path.realpath(directory) for directory in exclude}
+    real_root = os.path.realpath(root)
+
+    stack = [(root, '', matchers, 0)]
+    while stack:
+        directory, relative, matchers, depth = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            path = f"{relative}/{entry.name}" if relative else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_ignored(matchers, path, is_dir):
+                continue
+            if is_dir:
+                # Symlinks are not followed, so this is the real path
+                if excluded and os.path.join(real_root, path) in excluded:
+                    continue
+                if max_depth is None or depth < max_depth:
+                    subdirectories.append((entry.path, path))
+            elif entry.name.endswith(suffix) and entry.is_file():
+                yield Path(entry.path), path
+
+        for directory, path in reversed(subdirectories):
+            child_matchers = matchers
+            if use_gitignore:
+                gitignore = read_gitignore(directory, path)
+                if gitignore is not None:
+                    child_matchers = matchers + [gitignore]
+            stack.append((directory, path, child_matchers, depth + 1))
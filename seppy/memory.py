@@ -0,0 +1,131 @@
+import gc
+import time
+import contextlib
+from typing import Callable, Iterator, List, Optional
+
+import psutil
+
+from .config import MEMORY_SAMPLE_INTERVAL, MEMORY_MAX_SAMPLES, MEMORY_SOFT_LIMIT, MIN_MEMORY_LIMIT, MAX_MEMORY_LIMIT
+from .exceptions import MemoryLimitError
+from .utils import logger
+
+def get_memory_limit(limit_mb: int) -> int:
+    """Clamp a memory limit to MIN_MEMORY_LIMIT-MAX_MEMORY_LIMIT, warning if it changes."""
+    clamped = max(MIN_MEMORY_LIMIT, min(limit_mb, MAX_MEMORY_LIMIT))
+    if clamped != limit_mb:
+        logger.warning(
+            f"Memory limit of {limit_mb} MB is outside "
+            f"{MIN_MEMORY_LIMIT}-{MAX_MEMORY_LIMIT} MB, using {clamped} MB"
+        )
+    return clamped
+
+class MemoryGovernor:
+    """Samples the resident set size of the process and enforces a limit.
+
+    check is called at the checkpoints of a run. Above MEMORY_SOFT_LIMIT of
+    the limit the run degrades gracefully: garbage is collected, the
+    registered relief callbacks release what they can, and ``degraded``
+    turns on for the rest of the run, which callers use to build serially
+    and write with a single thread. Only if the process is still over the
+    limit after that does check raise MemoryLimitError.
+    """
+
+    def __init__(
+        self,
+        limit_mb: int,
+        samples: Optional[List[int]] = None,
+        interval: float = MEMORY_SAMPLE_INTERVAL,
+        include_children: bool = False
+    ):
+        """Initialize governor.
+
+        Args:
+            limit_mb: Memory limit in MB
+            samples: Optional list the RSS samples (in MB) are appended to;
+                only the latest MEMORY_MAX_SAMPLES or more are kept
+            interval: Minimum seconds between two samples of unforced checks
+            include_children: Add the RSS of all child processes, e.g. to
+                watch a whole worker pool from its parent
+        """
+        self.limit_mb = limit_mb
+        self.samples = samples if samples is not None else []
+        self.interval = interval
+        self.include_children = include_children
+        self.degraded = False
+        self._peak = max(self.samples, default=0)
+        self._process = psutil.Process()
+        self._last_check = 0.0
+        self._reliefs: List[Callable[[], None]] = []
+
+    def sample(self) -> int:
+        """Measure and record the current RSS in MB."""
+        rss = self._process.memory_info().rss
+        if self.include_children:
+            for child in self._process.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except psutil.Error:
+                    continue
+        rss //= 1024 * 1024
+        self.samples.append(rss)
+        self._peak = max(self._peak, rss)
+        # Long runs such as watch mode keep sampling, drop the oldest half
+        if len(self.samples) > MEMORY_MAX_SAMPLES * 2:
+            del self.samples[:-MEMORY_MAX_SAMPLES]
+        return rss
+
+    @contextlib.contextmanager
+    def relief(self, callback: Callable[[], None]) -> Iterator[None]:
+        """Register a callback that frees memory while the block runs."""
+        self._reliefs.append(callback)
+        try:
+            yield
+        finally:
+            self._reliefs.remove(callback)
+
+    def check(self, stage: str, force: bool = False) -> bool:
+        """Sample memory usage and react when it is close to the limit.
+
+        Args:
+            stage: What the run is doing, for log and error messages
+            force: Sample even if the last sample is more recent than
+                ``interval``
+
+        Returns:
+            True if the memory usage is close to the limit
+
+        Raises:
+            MemoryLimitError: If the usage is still over the limit after
+                releasing memory
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.interval:
+            return False
+        self._last_check = now
+
+        rss = self.sample()
+        if rss < self.limit_mb * MEMORY_SOFT_LIMIT:
+            return False
+
+        if not self.degraded:
+            logger.warning(
+                f"Memory usage of {rss} MB is close to the limit of {self.limit_mb} MB while {stage}; "
+                f"releasing memory and reducing parallelism"
+            )
+            self.degraded = True
+        for callback in list(self._reliefs):
+            callback()
+        gc.collect()
+
+        rss = self.sample()
+        if rss > self.limit_mb:
+            raise MemoryLimitError(
+                f"Memory usage of {rss} MB exceeds the limit of {self.limit_mb} MB while {stage}; "
+                f"raise MEMORY_LIMIT_MB or --memory-limit"
+            )
+        return True
+
+    @property
+    def peak(self) -> int:
+        """Highest RSS sampled so far, in MB, including dropped samples."""
+        return self._peak
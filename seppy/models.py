@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Set, Optional, List
+from typing import Dict, Set, Optional, List
 
 @dataclass
 class ModuleInfo:
@@ -31,4 +31,22 @@ class ProcessingStats:
     cached_modules: int = 0
     processing_time: float = 0.0
     memory_usage: List[int] = field(default_factory=list)
-    errors: List[str] = field(default_factory=list) 
\ No newline at end of file
+    errors: List[str] = field(default_factory=list) 
+
+@dataclass
+class FileResult:
+    """Outcome of splitting one file in a batch."""
+    source: str
+    output: str
+    modules: int = 0
+    processing_time: float = 0.0
+    error: Optional[str] = None
+    source_hash: Optional[str] = None
+    cache_bytes: int = 0
+
+@dataclass
+class AnalysisResult:
+    """Result of analyzing one source file, as stored in the cache."""
+    modules: Dict[str, ModuleInfo]
+    dependencies: Dict[str, List[str]]
+    has_async_code: bool = False
\ No newline at end of file
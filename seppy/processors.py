@@ -3,6 +3,7 @@
 import ast
 from typing import Dict, Set, Any, Tuple, Optional
 from .models import ModuleInfo
+from .source import get_source_segment
 from .analyzers import (
     find_used_imports,
     find_used_globals,
@@ -424,7 +425,7 @@ def create_complex_module(name: str, node: ast.AST, structures: Dict[str, Any])
     # Add original source code or reconstruct it
     if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
         # Get the source lines for the node
-        source_lines = ast.get_source_segment(structures.get('source', ''), node)
+        source_lines = get_source_segment(structures.get('source', ''), node)
         if source_lines:
             # Add decorators if they're not in the source
             decorators = []
@@ -496,7 +497,7 @@ def create_complex_module(name: str, node: ast.AST, structures: Dict[str, Any])
                     
                     # Get method source or reconstruct
                     if method.get('node'):
-                        method_source = ast.get_source_segment(structures.get('source', ''), method['node'])
+                        method_source = get_source_segment(structures.get('source', ''), method['node'])
                         if method_source:
                             code_parts.append("\n".join("    " + line for line in method_source.split("\n")))
                             continue
@@ -524,7 +525,7 @@ def create_complex_module(name: str, node: ast.AST, structures: Dict[str, Any])
                     
                     # Get method source or reconstruct
                     if method.get('node'):
-                        method_source = ast.get_source_segment(structures.get('source', ''), method['node'])
+                        method_source = get_source_segment(structures.get('source', ''), method['node'])
                         if method_source:
                             code_parts.append("\n".join("    " + line for line in method_source.split("\n")))
                             continue
@@ -559,14 +560,14 @@ def create_complex_module(name: str, node: ast.AST, structures: Dict[str, Any])
                 
                 # Get function source or reconstruct
                 if func_info.get('node'):
-                    body_source = ast.get_source_segment(structures.get('source', ''), func_info['node'])
+                    body_source = get_source_segment(structures.get('source', ''), func_info['node'])
                     if body_source:
                         code_parts.append(body_source)
                         
                         # Add nested functions with original source
                         for nested_name, nested_info in func_info.get('nested_functions', {}).items():
                             if nested_info.get('node'):
-                                nested_source = ast.get_source_segment(structures.get('source', ''), nested_info['node'])
+                                nested_source = get_source_segment(structures.get('source', ''), nested_info['node'])
                                 if nested_source:
                                     code_parts.append("\n" + nested_source)
                         return "\n".join(code_parts)
@@ -596,7 +597,7 @@ def create_complex_module(name: str, node: ast.AST, structures: Dict[str, Any])
                     
                     # Get nested function source or reconstruct
                     if nested_info.get('node'):
-                        nested_source = ast.get_source_segment(structures.get('source', ''), nested_info['node'])
+                        nested_source = get_source_segment(structures.get('source', ''), nested_info['node'])
                         if nested_source:
                             code_parts.append("\n".join("    " + line for line in nested_source.split("\n")))
                             continue
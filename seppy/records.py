@@ -0,0 +1,211 @@
+"""Binary record format of the analysis cache.
+
+A record is a little-endian, position-independent buffer:
+
+    header      magic, format version, record kind, flags and section counts
+    strings     (offset, length) of every distinct string
+    modules     per module: name, code, docstring and docs string ids, then
+                (start, count) slices of the id array for imports,
+                global_vars, functions, classes, async_functions,
+                dependencies and decorators
+    edges       per dependency graph node: string id and (start, count)
+                slice of its targets
+    ids         u32 string ids referenced by the slices
+    data        UTF-8 string data
+    footer      length and CRC-32 of everything before it
+
+Every section has a fixed-size layout computed from the header counts, so
+a record can be read straight from a memory map with ``struct`` and
+``array`` and nothing in it is ever executed. Bounds are checked while
+reading and the footer is verified first, so a truncated, torn or
+corrupt record raises CacheError.
+"""
+
+import sys
+import zlib
+import struct
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from .exceptions import CacheError
+from .models import AnalysisResult, ModuleInfo
+
+FORMAT_MAGIC = b'SEPC'
+FORMAT_VERSION = 2
+
+# Record kinds
+RECORD_RESULT = 1   # AnalysisResult of a file
+RECORD_MODULE = 2   # ModuleInfo of one definition
+
+# Header flags
+FLAG_ASYNC = 0x1    # AnalysisResult.has_async_code
+
+_HEADER = struct.Struct('<4sHHIIII')   # magic, version, kind, flags, strings, modules, edges
+_SPAN = struct.Struct('<II')           # offset/start, length/count
+_MODULE_SETS = ('imports', 'global_vars', 'functions', 'classes', 'async_functions', 'dependencies', 'decorators')
+_MODULE = struct.Struct('<IIII' + 'II' * len(_MODULE_SETS))
+_EDGE = struct.Struct('<III')
+_FOOTER = struct.Struct('<II')         # length, CRC-32 of the record before the footer
+_NONE = 0xFFFFFFFF   # String id of None
+
+class _StringTable:
+    """Deduplicating string table used while writing a record."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: List[bytes] = []
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return _NONE
+        sid = self.ids.get(value)
+        if sid is None:
+            sid = self.ids[value] = len(self.strings)
+            self.strings.append(value.encode('utf-8', 'surrogatepass'))
+        return sid
+
+def _dump(kind: int, flags: int, modules: Sequence[ModuleInfo], edges: Dict[str, Sequence[str]]) -> bytes:
+    """Serialize modules and dependency edges into a record."""
+    strings = _StringTable()
+    ids = array('I')
+
+    def slice_of(values) -> Tuple[int, int]:
+        start = len(ids)
+        ids.extend(strings.add(value) for value in values)
+        return start, len(ids) - start
+
+    module_rows = []
+    for module in modules:
+        row = [
+            strings.add(module.name),
+            strings.add(module.code),
+            strings.add(module.docstring),
+            strings.add(module.docs)
+        ]
+        for field_name in _MODULE_SETS:
+            row.extend(slice_of(getattr(module, field_name)))
+        module_rows.append(row)
+
+    edge_rows = [(strings.add(source), *slice_of(targets)) for source, targets in edges.items()]
+
+    if sys.byteorder != 'little':
+        ids.byteswap()
+    parts = [_HEADER.pack(FORMAT_MAGIC, FORMAT_VERSION, kind, flags, len(strings.strings), len(module_rows), len(edge_rows))]
+    offset = 0
+    for data in strings.strings:
+        parts.append(_SPAN.pack(offset, len(data)))
+        offset += len(data)
+    parts.extend(_MODULE.pack(*row) for row in module_rows)
+    parts.extend(_EDGE.pack(*row) for row in edge_rows)
+    parts.append(_SPAN.pack(len(ids), 0))
+    parts.append(ids.tobytes())
+    parts.extend(strings.strings)
+    body = b''.join(parts)
+    return body + _FOOTER.pack(len(body), zlib.crc32(body))
+
+def dump_result(result: AnalysisResult) -> bytes:
+    """Serialize the analysis result of a file."""
+    flags = FLAG_ASYNC if result.has_async_code else 0
+    return _dump(RECORD_RESULT, flags, list(result.modules.values()), result.dependencies)
+
+def dump_module(module: ModuleInfo) -> bytes:
+    """Serialize the module of one definition."""
+    return _dump(RECORD_MODULE, 0, [module], {})
+
+def load_record(buffer: Union[bytes, memoryview]) -> Union[AnalysisResult, ModuleInfo]:
+    """Read a record.
+
+    Args:
+        buffer: Record contents, e.g. a memory map of a cache entry
+
+    Returns:
+        AnalysisResult or ModuleInfo, depending on the record kind
+
+    Raises:
+        CacheError: If the record is not a valid record of this format version
+    """
+    # The views are released before returning, even on errors, so a memory
+    # map the record was read from can be closed while the exception is
+    # still being handled
+    buffer_view = memoryview(buffer)
+    view = data = None
+    try:
+        if len(buffer_view) < _HEADER.size + _FOOTER.size:
+            raise CacheError("truncated cache record")
+        length, checksum = _FOOTER.unpack_from(buffer_view, len(buffer_view) - _FOOTER.size)
+        if length != len(buffer_view) - _FOOTER.size:
+            raise CacheError("truncated cache record")
+        view = buffer_view[:length]
+        if zlib.crc32(view) != checksum:
+            raise CacheError("cache record checksum mismatch")
+        magic, version, kind, flags, string_count, module_count, edge_count = _HEADER.unpack_from(view, 0)
+        if magic != FORMAT_MAGIC:
+            raise CacheError("not a Seppy cache record")
+        if version != FORMAT_VERSION:
+            raise CacheError(f"unsupported cache record version {version}")
+        if kind not in (RECORD_RESULT, RECORD_MODULE):
+            raise CacheError(f"unknown cache record kind {kind}")
+
+        pos = _HEADER.size
+        spans = pos
+        pos += string_count * _SPAN.size
+        module_rows = list(_MODULE.iter_unpack(view[pos:pos + module_count * _MODULE.size]))
+        pos += module_count * _MODULE.size
+        edge_rows = list(_EDGE.iter_unpack(view[pos:pos + edge_count * _EDGE.size]))
+        pos += edge_count * _EDGE.size
+        id_count, _ = _SPAN.unpack_from(view, pos)
+        pos += _SPAN.size
+        ids = array('I')
+        ids.frombytes(view[pos:pos + id_count * ids.itemsize])
+        if sys.byteorder != 'little':
+            ids.byteswap()
+        pos += id_count * ids.itemsize
+        data = view[pos:]
+        if len(module_rows) != module_count or len(edge_rows) != edge_count or len(ids) != id_count:
+            raise CacheError("truncated cache record")
+
+        cache: Dict[int, str] = {}
+
+        def string(sid: int) -> Optional[str]:
+            if sid == _NONE:
+                return None
+            value = cache.get(sid)
+            if value is None:
+                if sid >= string_count:
+                    raise CacheError("invalid string reference in cache record")
+                offset, length = _SPAN.unpack_from(view, spans + sid * _SPAN.size)
+                if offset + length > len(data):
+                    raise CacheError("truncated cache record")
+                value = cache[sid] = str(data[offset:offset + length], 'utf-8', 'surrogatepass')
+            return value
+
+        def strings_of(start: int, count: int) -> List[str]:
+            if start + count > id_count:
+                raise CacheError("invalid slice in cache record")
+            return [string(sid) for sid in ids[start:start + count]]
+
+        modules = []
+        for row in module_rows:
+            name, code, docstring, docs = (string(sid) for sid in row[:4])
+            sets = {
+                field_name: set(strings_of(row[4 + 2 * i], row[5 + 2 * i]))
+                for i, field_name in enumerate(_MODULE_SETS)
+            }
+            modules.append(ModuleInfo(name=name, code=code, docstring=docstring, docs=docs or "", **sets))
+        edges = {string(row[0]): strings_of(row[1], row[2]) for row in edge_rows}
+    except (struct.error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise CacheError(f"corrupt cache record: {e}")
+    finally:
+        for released in (data, view, buffer_view):
+            if released is not None:
+                released.release()
+
+    if kind == RECORD_MODULE:
+        if len(modules) != 1:
+            raise CacheError("module record must hold exactly one module")
+        return modules[0]
+    return AnalysisResult(
+        modules={module.name: module for module in modules},
+        dependencies=edges,
+        has_async_code=bool(flags & FLAG_ASYNC)
+    )
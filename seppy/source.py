@@ -0,0 +1,171 @@
+"""Source file text with a precomputed line-offset index."""
+
+import ast
+import io
+import re
+import hashlib
+import tokenize
+from typing import List, Optional, Union
+
+_LINE_END = re.compile(rb'\r\n|\r|\n')
+
+def hash_content(data: bytes) -> str:
+    """Get the content hash of a source file, as used in cache keys."""
+    return hashlib.blake2b(data, digest_size=32).hexdigest()
+
+class SourceFile:
+    """Source text of one input file.
+
+    Built once per input and shared by the analyzers and processors. Line
+    start offsets are computed up front, so extracting the source of a node
+    is a slice of the encoded text instead of re-splitting the whole file
+    the way ast.get_source_segment does.
+    """
+
+    def __init__(
+        self,
+        text: str,
+        path: Optional[str] = None,
+        raw: Optional[bytes] = None,
+        encoding: str = 'utf-8'
+    ):
+        """Initialize source file.
+
+        Args:
+            text: Decoded source text with normalized newlines
+            path: Optional path of the input file
+            raw: Optional file contents as read from disk
+            encoding: Encoding used to decode ``raw``
+        """
+        self.text = text
+        self.path = path
+        self.encoding = encoding
+        self.raw = raw if raw is not None else text.encode('utf-8')
+        # AST column offsets count UTF-8 bytes of the decoded text
+        if raw is not None and encoding == 'utf-8' and b'\r' not in raw:
+            self.data = raw
+        else:
+            self.data = text.encode('utf-8')
+        self._hash: Optional[str] = None
+        self.line_offsets = self._index_lines(self.data)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes, path: Optional[str] = None) -> 'SourceFile':
+        """Decode file contents using the PEP 263 encoding rules.
+
+        Newlines are normalized the same way as reading in text mode.
+        """
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(raw).readline)
+        text = raw.decode(encoding)
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return cls(text, path, raw, encoding)
+
+    @property
+    def hash(self) -> str:
+        """Content hash of the file as read from disk, computed on first use."""
+        if self._hash is None:
+            self._hash = hash_content(self.raw)
+        return self._hash
+
+    @staticmethod
+    def _index_lines(data: bytes) -> List[int]:
+        """Get the byte offset of every line start (same line breaks as the parser)."""
+        offsets = [0]
+        offsets.extend(match.end() for match in _LINE_END.finditer(data))
+        return offsets
+
+    def get_segment(self, node: ast.AST) -> Optional[str]:
+        """Get the source code of a node, like ast.get_source_segment."""
+        try:
+            if node.end_lineno is None or node.end_col_offset is None:
+                return None
+            start = self.line_offsets[node.lineno - 1] + node.col_offset
+            end = self.line_offsets[node.end_lineno - 1] + node.end_col_offset
+        except (AttributeError, IndexError):
+            return None
+        return self.data[start:end].decode('utf-8')
+
+    def get_lines(self, node: ast.AST) -> Optional[bytes]:
+        """Get the encoded source of a node from the start of its first line.
+
+        Definitions start at their first decorator. Unlike get_segment the
+        result keeps the indentation of the first line.
+        """
+        try:
+            start_line = node.lineno
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.decorator_list:
+                start_line = node.decorator_list[0].lineno
+            if node.end_lineno is None or node.end_col_offset is None:
+                return None
+            start = self.line_offsets[start_line - 1]
+            end = self.line_offsets[node.end_lineno - 1] + node.end_col_offset
+        except (AttributeError, IndexError):
+            return None
+        return self.data[start:end] if end > start else None
+
+    def get_code(self, node: ast.AST) -> Optional[str]:
+        """Get the original code of a node, ready to be emitted on its own.
+
+        Statements include their decorators and have continuation lines
+        dedented to the statement's indentation (lines inside multi-line
+        strings are left alone). Expressions spanning several lines are only
+        returned if they parse on their own, since they may rely on brackets
+        outside the node. Returns None when the code has to be unparsed.
+        """
+        try:
+            start_line, start_col = node.lineno, node.col_offset
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.decorator_list:
+                start_line = node.decorator_list[0].lineno
+            if node.end_lineno is None or node.end_col_offset is None:
+                return None
+            start = self.line_offsets[start_line - 1] + start_col
+            end = self.line_offsets[node.end_lineno - 1] + node.end_col_offset
+        except (AttributeError, IndexError):
+            return None
+        if end <= start:
+            return None
+        code = self.data[start:end].decode('utf-8')
+
+        if '\n' not in code:
+            return code
+        if isinstance(node, ast.stmt):
+            return self._dedent(code, start_line, start_col, node)
+        try:
+            ast.parse(code, mode='eval')
+        except SyntaxError:
+            return None
+        return code
+
+    @staticmethod
+    def _dedent(code: str, start_line: int, indent: int, node: ast.AST) -> str:
+        """Strip a statement's indentation from its continuation lines."""
+        in_string = set()
+        for child in ast.walk(node):
+            if isinstance(child, (ast.Constant, ast.JoinedStr)) and child.end_lineno > child.lineno:
+                in_string.update(range(child.lineno + 1, child.end_lineno + 1))
+
+        lines = code.split('\n')
+        for i in range(1, len(lines)):
+            line = lines[i]
+            if start_line + i not in in_string and line[:indent].isspace():
+                lines[i] = line[indent:]
+        return '\n'.join(lines)
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+def read_source(path: str) -> SourceFile:
+    """Read and decode a source file exactly once."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return SourceFile.from_bytes(raw, path)
+
+def get_source_segment(source: Union[SourceFile, str], node: ast.AST) -> Optional[str]:
+    """Get the source code of a node from a SourceFile or plain source text."""
+    if isinstance(source, SourceFile):
+        return source.get_segment(node)
+    return ast.get_source_segment(source, node)
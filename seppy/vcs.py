@@ -0,0 +1,54 @@
+import os
+import subprocess
+from pathlib import Path
+from typing import List, Set, Union
+
+from .exceptions import GitError
+
+def run_git(args: List[str], cwd: Union[str, Path]) -> bytes:
+    """Run a git command and return its output.
+
+    Raises:
+        GitError: If git cannot be run or the command fails
+    """
+    try:
+        result = subprocess.run(['git', *args], cwd=cwd, capture_output=True)
+    except OSError as e:
+        raise GitError(f"Could not run git: {e}")
+    if result.returncode != 0:
+        message = result.stderr.decode('utf-8', 'replace').strip()
+        raise GitError(message or f"git {' '.join(args)} failed")
+    return result.stdout
+
+def get_changed_files(rev: str, cwd: Union[str, Path] = '.') -> Set[Path]:
+    """Get the files added or modified since a git revision.
+
+    The working tree is compared with the revision, so committed, staged
+    and unstaged changes all count, as do untracked files that are not
+    ignored. Deleted files are left out.
+
+    Args:
+        rev: Any revision git understands (commit, branch, tag, ``HEAD~3``)
+        cwd: Directory inside the repository
+
+    Returns:
+        Resolved paths of the changed files
+
+    Raises:
+        GitError: If ``cwd`` is not in a git repository or ``rev`` is unknown
+    """
+    root = Path(os.fsdecode(run_git(['rev-parse', '--show-toplevel'], cwd).strip()))
+    try:
+        run_git(['rev-parse', '--verify', '--quiet', f"{rev}^{{commit}}"], root)
+    except GitError:
+        raise GitError(f"Unknown git revision: {rev}")
+
+    changed = set()
+    fields = run_git(['diff', '--name-status', '--no-renames', '-z', rev, '--'], root).split(b'\0')
+    for status, name in zip(fields[0::2], fields[1::2]):
+        if status != b'D':
+            changed.add((root / os.fsdecode(name)).resolve())
+    for name in run_git(['ls-files', '--others', '--exclude-standard', '-z'], root).split(b'\0'):
+        if name:
+            changed.add((root / os.fsdecode(name)).resolve())
+    return changed
@@ -0,0 +1,148 @@
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .core import Seppy, load_config
+from .batch import discover_sources, update_index
+from .cache import get_cache_dir
+from .config import WATCH_INTERVAL, WATCH_DEBOUNCE
+from .models import FileResult
+from .utils import logger
+
+# Stat data of a watched file: (size, mtime_ns, inode)
+FileState = Tuple[int, int, int]
+
+class Watcher:
+    """Re-splits source files incrementally as they change.
+
+    The watched files are found like in batch mode and polled for stat
+    changes, which works the same on every platform and file system. A
+    burst of changes (an editor writing a file in several steps, a branch
+    switch) is processed once it has settled for ``debounce`` seconds, and
+    only the files that changed are split again with
+    Seppy.split_incremental. Each file keeps its Seppy instance between
+    saves, so its configuration, cache and incremental state stay loaded
+    in this warm process. The output and cache directories are never
+    watched, so the files a split writes do not trigger another one. When
+    several files are watched, the combined dependency graph and
+    documentation index of batch mode are updated after every split.
+    """
+
+    def __init__(
+        self,
+        sources: Sequence[str],
+        output_dir: str,
+        config_file: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        use_gitignore: bool = False,
+        interval: float = WATCH_INTERVAL,
+        debounce: float = WATCH_DEBOUNCE
+    ):
+        """Initialize watcher.
+
+        Args:
+            sources: Python files, directories or glob patterns to watch
+            output_dir: Output directory; a single file is split into it
+                directly, otherwise every file gets its own subdirectory
+            config_file: Optional path to configuration file
+            cache_dir: Optional cache directory override
+            use_gitignore: Skip files ignored by .gitignore files
+            interval: Seconds between polls
+            debounce: Seconds without further changes before splitting
+        """
+        self.sources = list(sources)
+        self.output_dir = Path(output_dir)
+        self.config_file = config_file
+        self.cache_dir = cache_dir
+        self.interval = interval
+        self.debounce = debounce
+        config = load_config(config_file)
+        self.ignore_patterns = config["IGNORE_PATTERNS"]
+        self.use_gitignore = use_gitignore or config.get("USE_GITIGNORE", False)
+        self.exclude = [self.output_dir, get_cache_dir(config, cache_dir)]
+        self.single_file = len(self.sources) == 1 and os.path.isfile(self.sources[0])
+        self._targets: Dict[Path, Path] = {}
+        # (source file, output subdirectory) pairs of the last snapshot
+        self._jobs: List[Tuple[Path, Path]] = []
+        self._splitters: Dict[Path, Seppy] = {}
+
+    def snapshot(self) -> Dict[Path, FileState]:
+        """Find the watched files and get their stat data."""
+        jobs = discover_sources(self.sources, self.ignore_patterns, self.use_gitignore, self.exclude)
+        state = {}
+        for path, relative in jobs:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            state[path] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            self._targets[path] = self.output_dir if self.single_file else self.output_dir / relative
+        self._jobs = [(path, relative) for path, relative in jobs if path in state]
+        return state
+
+    def split(self, paths: List[Path]) -> List[FileResult]:
+        """Split files incrementally, logging failures, and update the index.
+
+        Returns:
+            Results of the files, in order
+        """
+        results = []
+        for path in paths:
+            start_time = time.perf_counter()
+            result = FileResult(source=str(path), output=str(self._targets[path]))
+            results.append(result)
+            try:
+                splitter = self._splitters.get(path)
+                if splitter is None:
+                    splitter = Seppy(str(path), config_file=self.config_file, cache_dir=self.cache_dir)
+                    self._splitters[path] = splitter
+                changes = splitter.split_incremental(str(self._targets[path]))
+            except Exception as e:
+                # A failing file must not end the watch
+                logger.error(f"Failed to split {path}: {e}")
+                result.error = str(e) or type(e).__name__
+                continue
+            result.modules = splitter.stats.total_modules
+            result.processing_time = time.perf_counter() - start_time
+            summary = ', '.join(f"{len(names)} {kind}" for kind, names in changes.items() if names)
+            logger.info(f"Split {path} in {result.processing_time * 1000:.0f} ms ({summary or 'no changes'})")
+
+        if not self.single_file:
+            update_index(str(self.output_dir), self._jobs, results)
+        return results
+
+    def run(self, should_stop: Callable[[], bool] = lambda: False) -> None:
+        """Split every watched file, then keep splitting the ones that change.
+
+        Args:
+            should_stop: Called after every poll; the loop ends once it
+                returns True (by default it runs until interrupted)
+        """
+        previous = self.snapshot()
+        logger.info(f"Watching {len(previous)} files, press Ctrl+C to stop")
+        self.split(sorted(previous))
+
+        while not should_stop():
+            time.sleep(self.interval)
+            try:
+                current = self.snapshot()
+                if current == previous:
+                    continue
+                # Wait until the burst of changes has settled
+                while True:
+                    time.sleep(self.debounce)
+                    settled = self.snapshot()
+                    if settled == current:
+                        break
+                    current = settled
+            except FileNotFoundError as e:
+                logger.warning(f"{e}; retrying")
+                continue
+
+            changed = sorted(path for path, state in current.items() if previous.get(path) != state)
+            for path in sorted(set(previous) - set(current)):
+                logger.info(f"No longer watching {path}")
+                self._splitters.pop(path, None)
+            previous = current
+            self.split(changed)
@@ -0,0 +1,220 @@
+import os
+import json
+import hashlib
+import threading
+import concurrent.futures
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Union
+
+from .config import MIN_THREADS, MAX_THREADS, OUTPUT_MANIFEST_NAME
+from .models import ProcessingStats
+from .utils import logger
+
+class OutputWriter:
+    """Writer stage for output files, backed by a bounded thread pool.
+
+    Content is produced in the worker threads, so generating one file (for
+    example its documentation) overlaps with writing others. A failure only
+    affects its own file: it is logged and recorded in
+    ``ProcessingStats.errors``.
+
+    A manifest of the content hash, size and mtime of every written file is
+    kept in the output directory. Files whose content is unchanged are not
+    rewritten, and files listed in the previous manifest that were not
+    written again are deleted, so a run that changes nothing touches no
+    files at all.
+    """
+
+    def __init__(
+        self,
+        output_dir: Union[str, Path],
+        max_workers: int = MIN_THREADS,
+        stats: Optional[ProcessingStats] = None
+    ):
+        """Initialize writer.
+
+        Args:
+            output_dir: Directory that relative output paths are resolved against
+            max_workers: Number of writer threads (clamped to MIN_THREADS..MAX_THREADS)
+            stats: Optional statistics to record errors in
+        """
+        self.output_dir = Path(output_dir)
+        self.manifest_path = self.output_dir / OUTPUT_MANIFEST_NAME
+        self.stats = stats if stats is not None else ProcessingStats()
+        self.max_workers = max(MIN_THREADS, min(max_workers, MAX_THREADS))
+        self.written = 0
+        self.unchanged = 0
+        self.removed = 0
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._futures: List[concurrent.futures.Future] = []
+        self._previous: Dict[str, Dict[str, int]] = {}
+        self._manifest: Dict[str, Dict[str, int]] = {}
+        self._failed: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'OutputWriter':
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._previous = self._load_manifest()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="seppy-writer"
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.wait()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        # Only a complete run knows which outputs are stale
+        if exc_type is None:
+            self._remove_stale()
+            self._save_manifest()
+            logger.info(
+                f"Output: {self.written} written, {self.unchanged} unchanged, {self.removed} removed"
+            )
+
+    def submit(self, path: Union[str, Path], content: Callable[[], str], description: str) -> None:
+        """Queue a file to be produced and written.
+
+        Args:
+            path: Output path, relative to the output directory
+            content: Callable returning the file contents, run in a worker thread
+            description: What the file is, for log and error messages
+        """
+        self._futures.append(
+            self._executor.submit(self._write, Path(path).as_posix(), content, description)
+        )
+
+    @property
+    def failed(self) -> Set[str]:
+        """Output paths (relative, ``/`` separated) that failed to save."""
+        return set(self._failed)
+
+    def keep(self, *paths: Union[str, Path]) -> bool:
+        """Keep outputs of the previous run without producing them again.
+
+        Either all or none of the paths are kept; a path that is not in the
+        previous manifest or no longer exists has to be submitted instead.
+
+        Args:
+            paths: Output paths, relative to the output directory
+
+        Returns:
+            True if the outputs were kept
+        """
+        keys = [Path(path).as_posix() for path in paths]
+        if not all(key in self._previous and (self.output_dir / key).exists() for key in keys):
+            return False
+        with self._lock:
+            for key in keys:
+                self._manifest[key] = self._previous[key]
+                self.unchanged += 1
+        return True
+
+    def wait(self) -> int:
+        """Wait for all queued files.
+
+        Returns:
+            Number of files that failed
+        """
+        failed = 0
+        for future in concurrent.futures.as_completed(self._futures):
+            if not future.result():
+                failed += 1
+        self._futures = []
+        return failed
+
+    def _write(self, key: str, content: Callable[[], str], description: str) -> bool:
+        """Produce and write one file, recording a failure instead of raising."""
+        path = self.output_dir / key
+        try:
+            data = content().encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()
+            if self._is_unchanged(key, path, digest):
+                stat = path.stat()
+                logger.debug(f"Unchanged {description} at {path}")
+                with self._lock:
+                    self.unchanged += 1
+                    self._manifest[key] = self._entry(digest, stat)
+                return True
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            stat = path.stat()
+            logger.info(f"Saved {description} to {path}")
+            with self._lock:
+                self.written += 1
+                self._manifest[key] = self._entry(digest, stat)
+            return True
+        except Exception as e:
+            error = f"Failed to save {description} to {path}: {str(e)}"
+            logger.error(error)
+            with self._lock:
+                self._failed.add(key)
+                self.stats.errors.append(error)
+            return False
+
+    def _is_unchanged(self, key: str, path: Path, digest: str) -> bool:
+        """Check whether a file on disk already has the given content hash."""
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        previous = self._previous.get(key)
+        if previous is not None and previous.get('hash') == digest:
+            # Trust the manifest as long as the file was not touched since
+            if previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+                return True
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest() == digest
+
+    @staticmethod
+    def _entry(digest: str, stat: os.stat_result) -> Dict[str, Union[str, int]]:
+        """Create the manifest entry of a file."""
+        return {'hash': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _load_manifest(self) -> Dict[str, Dict[str, int]]:
+        """Load the manifest of the previous run."""
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable output manifest {self.manifest_path}: {e}")
+            return {}
+        files = manifest.get('files') if isinstance(manifest, dict) else None
+        return files if isinstance(files, dict) else {}
+
+    def _remove_stale(self) -> None:
+        """Delete outputs of the previous run that were not produced again."""
+        for key in sorted(set(self._previous) - set(self._manifest) - self._failed):
+            path = self.output_dir / key
+            try:
+                path.unlink()
+                self.removed += 1
+                logger.info(f"Removed stale output {path}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                error = f"Failed to remove stale output {path}: {str(e)}"
+                logger.error(error)
+                self.stats.errors.append(error)
+
+    def _save_manifest(self) -> None:
+        """Write the manifest, unless it is unchanged."""
+        files = dict(self._manifest)
+        # Keep entries of files that failed, their previous content is still there
+        for key in self._failed:
+            if key in self._previous:
+                files[key] = self._previous[key]
+        if files == self._previous and self.manifest_path.exists():
+            return
+        try:
+            with open(self.manifest_path, 'w', encoding='utf-8') as f:
+                json.dump({'files': dict(sorted(files.items()))}, f, indent=2)
+        except OSError as e:
+            error = f"Failed to save output manifest {self.manifest_path}: {str(e)}"
+            logger.error(error)
+            self.stats.errors.append(error)